@@ -0,0 +1,50 @@
+'''Concurrent cart-write throughput: rollback journal vs WAL with tuned pragmas
+
+Each run uses a fresh database in a temporary directory, so the real shop
+database is never touched. Run from the repository root:
+
+    python -m benchmarks.cart_writes [users] [writes_per_user]
+'''
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from config import SQLITE_PRAGMAS
+from database.models import Database
+
+# The pre-tuning behaviour: SQLite defaults
+ROLLBACK_JOURNAL = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+async def run(pragmas: dict, users: int, writes_per_user: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, 'bench.db'), pragmas=pragmas, checkpoint_interval=0)
+        await db.connect()
+        await db.init_db()
+
+        async def shopper(user_id: int):
+            for product_id in range(writes_per_user):
+                await db.add_to_cart(user_id, product_id % 10, 'Product', 9.99)
+                # Interleave reads the way the cart screen does
+                await db.get_cart_total(user_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[shopper(user_id) for user_id in range(users)])
+        elapsed = time.perf_counter() - started
+        print(f"  pool: {db.pool_stats()['writer']}")
+        await db.close()
+        return users * writes_per_user / elapsed
+
+
+async def main(users: int, writes_per_user: int):
+    for name, pragmas in (('rollback journal', ROLLBACK_JOURNAL), ('WAL + tuned', SQLITE_PRAGMAS)):
+        print(f"{name}:")
+        rate = await run(pragmas, users, writes_per_user)
+        print(f"  {rate:,.0f} cart writes/s ({users} users x {writes_per_user} writes)")
+
+
+if __name__ == '__main__':
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    asyncio.run(main(users, writes))
@@ -0,0 +1,103 @@
+'''Updates per second handled by cluster mode at different worker counts
+
+Seeds a throwaway database with registered users and carts, then for each
+worker count starts a Cluster whose bots talk to a fake Bot API session
+(replies take LATENCY seconds and are not sent anywhere) and routes a
+burst of /start and cart messages through the real handlers. The time
+covers routing until every worker has handled its queue and shut down.
+Run from the repository root:
+
+    python -m benchmarks.cluster_throughput [users] [updates_per_user] [workers...]
+'''
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Any
+from aiogram.client.session.base import BaseSession
+from cluster import Cluster
+from config import SQLITE_PRAGMAS
+from database.models import Database
+from utils.translations import get_text
+
+LATENCY = 0.005  # Seconds per fake Bot API call
+
+
+class FakeSession(BaseSession):
+    '''Bot API session that answers every method with True after LATENCY seconds'''
+
+    async def make_request(self, bot, method, timeout=None) -> Any:
+        await asyncio.sleep(LATENCY)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                             raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+async def seed(path: str, users: int):
+    db = Database(path, pragmas=SQLITE_PRAGMAS)
+    await db.connect()
+    await db.init_db()
+    async with db.writer() as conn:
+        await conn.executemany('''
+            INSERT INTO users (user_id, first_name, last_name, email, phone, language)
+            VALUES (?, 'First', 'Last', 'user@example.com', '+998900000000', 'en')
+        ''', [(user_id,) for user_id in range(1, users + 1)])
+        await conn.executemany('''
+            INSERT INTO cart (user_id, product_id, title, price, quantity)
+            VALUES (?, ?, 'Product', 9.99, 1)
+        ''', [(user_id, product_id) for user_id in range(1, users + 1) for product_id in (1, 2, 3)])
+    await db.close()
+
+
+def updates(users: int, per_user: int):
+    '''Alternating /start and cart-button messages, users interleaved'''
+    texts = ['/start', get_text('cart', 'en')]
+    update_id = 0
+    for round_ in range(per_user):
+        for user_id in range(1, users + 1):
+            update_id += 1
+            text = texts[round_ % 2]
+            message = {
+                'message_id': update_id, 'date': 0, 'text': text,
+                'chat': {'id': user_id, 'type': 'private', 'first_name': 'First'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'First'}
+            }
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+            yield {'update_id': update_id, 'message': message}
+
+
+async def measure(path: str, workers: int, users: int, per_user: int) -> float:
+    cluster = Cluster(workers, {'session': FakeSession(), 'database_path': path})
+    await cluster.start()
+    burst = list(updates(users, per_user))
+    started = time.perf_counter()
+    for offset in range(0, len(burst), 100):
+        cluster.route(burst[offset:offset + 100])
+    await cluster.stop(timeout=600)
+    return len(burst) / (time.perf_counter() - started)
+
+
+async def main(users: int, per_user: int, worker_counts):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        await seed(path, users)
+        results = [(workers, await measure(path, workers, users, per_user))
+                   for workers in worker_counts]
+
+    print(f"\n{users} users x {per_user} updates, {LATENCY * 1000:.0f}ms per Bot API call")
+    baseline = results[0][1]
+    for workers, rate in results:
+        print(f"{workers:>3} workers: {rate:8.0f} updates/s  ({rate / baseline:4.2f}x)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+                     [int(arg) for arg in sys.argv[3:]] or [1, 2, 4]))
@@ -0,0 +1,79 @@
+'''FSM state read/write latency per storage backend
+
+Replays the storage calls of a checkout (set_state plus update_data for each
+step, and get_state/get_data from the state filters) for many concurrent
+users. SQLite runs use a fresh database in a temporary directory. Pass a
+Redis URL (a local redis-server or any Redis-compatible stand-in) to include
+RedisStorage. Run from the repository root:
+
+    python -m benchmarks.fsm_storage [users] [redis_url]
+'''
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from benchmarks.search_latency import report
+from database.fsm_storage import SQLiteStorage
+from database.models import Database
+from config import SQLITE_PRAGMAS
+
+CHECKOUT_STEPS = [
+    ('CheckoutStates:waiting_for_promo', {'idempotency_key': 'x' * 64}),
+    ('CheckoutStates:waiting_for_location', {'discount_percent': 10}),
+    ('CheckoutStates:waiting_for_payment', {'latitude': 41.31, 'longitude': 69.28}),
+]
+
+
+async def checkout(storage: BaseStorage, user_id: int, reads: List[float], writes: List[float]):
+    key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+    for state, data in CHECKOUT_STEPS:
+        started = time.perf_counter()
+        await storage.get_state(key)
+        await storage.get_data(key)
+        reads.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await storage.update_data(key, data)
+        await storage.set_state(key, state)
+        writes.append(time.perf_counter() - started)
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+
+
+async def run(name: str, storage: BaseStorage, users: int):
+    reads, writes = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*[checkout(storage, user_id, reads, writes) for user_id in range(users)])
+    await storage.close()
+    elapsed = time.perf_counter() - started
+    print(f"{name}: {users} checkouts in {elapsed:.2f}s")
+    report('read', reads)
+    report('write', writes)
+    if isinstance(storage, SQLiteStorage):
+        print(f"  {storage.stats()}")
+
+
+async def main(users: int, redis_url: str = None):
+    await run('memory', MemoryStorage(), users)
+
+    for label, flush_interval in (('sqlite write-through', 0), ('sqlite batched', 0.5)):
+        with tempfile.TemporaryDirectory() as directory:
+            db = Database(os.path.join(directory, 'bench.db'), pragmas=SQLITE_PRAGMAS,
+                          checkpoint_interval=0)
+            await db.connect()
+            await db.init_db()
+            await run(label, SQLiteStorage(db, flush_interval=flush_interval), users)
+            await db.close()
+
+    if redis_url:
+        from aiogram.fsm.storage.redis import RedisStorage
+        await run('redis', RedisStorage.from_url(redis_url), users)
+
+
+if __name__ == '__main__':
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    asyncio.run(main(users, sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,82 @@
+'''Decode time and allocations for a catalog payload per JSON decoder backend
+
+Decodes a full /products response into Product objects with every
+installed backend: a generic decode followed by field picking, and (with
+msgspec) the schema-directed decoder the service uses. By default the
+payload is the synthetic fixture from benchmarks.product_memory; pass a
+recorded response instead, or record one first (needs network access):
+
+    python -m benchmarks.json_decode --record benchmarks/fixtures/products.json
+    python -m benchmarks.json_decode [benchmarks/fixtures/products.json] [rounds]
+'''
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from benchmarks.product_memory import fixture_product
+from services.api_service import DummyJSONService
+from services.json_decoding import JSONDecoder, available_backends
+from services.models import Product
+
+
+async def record(path: str):
+    '''Save the raw body of /products?limit=0 (the whole catalog)'''
+    api = DummyJSONService()
+    try:
+        body = await api._get_json('/products', {'limit': 0}, decode=lambda raw: raw)
+    finally:
+        await api.close()
+    if body is None:
+        sys.exit("Could not fetch /products from DummyJSON")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(body)
+    print(f"Recorded {len(body):,} bytes to {path}")
+
+
+def generic(loads):
+    '''Decode the whole document, then pick the Product fields out of it'''
+    def decode(body: bytes):
+        return [Product.from_api(item) for item in loads(body)['products']]
+    return decode
+
+
+def measure(name: str, decode, body: bytes, rounds: int):
+    decode(body)  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        decode(body)
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    decode(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:>18}: {elapsed * 1000:7.2f}ms/decode  peak {peak / 1024:8.0f} KiB")
+
+
+def main(path: str, rounds: int):
+    if path:
+        with open(path, 'rb') as f:
+            body = f.read()
+    else:
+        products = [fixture_product(i) for i in range(1, 195)]
+        body = json.dumps({'products': products, 'total': len(products)}).encode()
+    count = len(JSONDecoder('json').product_list(body)['products'])
+    print(f"{len(body):,} bytes, {count} products, {rounds} rounds")
+
+    for backend in available_backends():
+        decoder = JSONDecoder(backend)
+        measure(backend, generic(decoder.loads), body, rounds)
+        if backend == 'msgspec':
+            measure('msgspec + schema', decoder.product_list, body, rounds)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--record':
+        asyncio.run(record(sys.argv[2]))
+    else:
+        main(sys.argv[1] if len(sys.argv) > 1 else None,
+             int(sys.argv[2]) if len(sys.argv) > 2 else 50)
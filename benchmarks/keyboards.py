@@ -0,0 +1,54 @@
+'''Keyboard markup construction cost per call, rebuilt vs cached
+
+Calls each keyboard factory the way a handler does and reports the time
+per call with every cache cleared before each call (the markup is built
+from scratch, as before caching) and with warm caches. Run from the
+repository root:
+
+    python -m benchmarks.keyboards [calls]
+'''
+import sys
+import time
+from keyboards import inline, reply
+
+CATEGORIES = [{'slug': f'category-{i}', 'name': f'Category {i}'} for i in range(24)]
+CART = [{'title': f'Product {i}', 'quantity': i, 'product_id': i} for i in range(1, 4)]
+
+CASES = {
+    'main menu': lambda i: reply.get_main_menu_keyboard('en', False),
+    'categories': lambda i: inline.get_categories_keyboard(CATEGORIES, 'en'),
+    'product page': lambda i: inline.get_product_keyboard(i % 200, 'en', True, i % 10, 10),
+    'cart': lambda i: inline.get_cart_keyboard(CART, 'en'),
+    'admin': lambda i: inline.get_admin_keyboard('en')
+}
+
+CACHES = [inline._categories_keyboard, inline._product_keyboard_rows, inline._cart_keyboard_rows,
+          inline._empty_cart_keyboard, inline.get_admin_keyboard, reply.get_main_menu_keyboard]
+
+
+def clear_caches():
+    for cache in CACHES:
+        cache.cache_clear()
+
+
+def measure(build, calls: int, cached: bool) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        if not cached:
+            clear_caches()
+        build(i)
+    return (time.perf_counter() - started) / calls
+
+
+def main(calls: int):
+    print(f"{calls} calls per keyboard")
+    for name, build in CASES.items():
+        rebuilt = measure(build, calls, cached=False)
+        build(0)  # warm up
+        cached = measure(build, calls, cached=True)
+        print(f"{name:>13}: rebuilt {rebuilt * 1e6:8.1f}us  cached {cached * 1e6:7.1f}us  "
+              f"({rebuilt / cached:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
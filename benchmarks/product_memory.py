@@ -0,0 +1,82 @@
+'''Bytes per cached product: raw DummyJSON dicts vs parsed Product objects
+
+Uses a synthetic catalog shaped like /products responses (reviews,
+dimensions, meta, image lists, ...) so it runs offline. The JSON text is
+decoded once per measurement, as the HTTP client does, and tracemalloc
+reports what stays allocated. Run from the repository root:
+
+    python -m benchmarks.product_memory [products]
+'''
+import gc
+import json
+import sys
+import tracemalloc
+from services.models import Product
+
+CATEGORIES = ['beauty', 'fragrances', 'furniture', 'groceries', 'laptops', 'smartphones']
+
+
+def fixture_product(product_id: int) -> dict:
+    '''One product with every field a real /products item carries'''
+    category = CATEGORIES[product_id % len(CATEGORIES)]
+    return {
+        'id': product_id,
+        'title': f'Product {product_id} Deluxe Edition',
+        'description': f'A {category} item number {product_id} with a description of typical length '
+                       'that explains what the product is and why someone would want to buy it.',
+        'category': category,
+        'price': 9.99 + product_id,
+        'discountPercentage': 7.17,
+        'rating': 4.56,
+        'stock': 25,
+        'tags': [category, 'popular'],
+        'brand': f'Brand {product_id % 40}',
+        'sku': f'SKU-{product_id:08d}',
+        'weight': 2,
+        'dimensions': {'width': 23.17, 'height': 14.43, 'depth': 28.01},
+        'warrantyInformation': '1 month warranty',
+        'shippingInformation': 'Ships in 1 month',
+        'availabilityStatus': 'In Stock',
+        'reviews': [
+            {'rating': 2 + review, 'comment': 'Very happy with my purchase!',
+             'date': '2024-05-23T08:56:21.618Z', 'reviewerName': f'Reviewer {review}',
+             'reviewerEmail': f'reviewer{review}@x.dummyjson.com'}
+            for review in range(3)
+        ],
+        'returnPolicy': '30 days return policy',
+        'minimumOrderQuantity': 24,
+        'meta': {'createdAt': '2024-05-23T08:56:21.618Z', 'updatedAt': '2024-05-23T08:56:21.618Z',
+                 'barcode': '9164035109868', 'qrCode': 'https://assets.dummyjson.com/public/qr-code.png'},
+        'images': [f'https://cdn.dummyjson.com/products/images/{category}/{product_id}/{image}.png'
+                   for image in range(1, 4)],
+        'thumbnail': f'https://cdn.dummyjson.com/products/images/{category}/{product_id}/thumbnail.png'
+    }
+
+
+def retained_bytes(build) -> int:
+    '''Bytes still allocated by the object build() returns'''
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main(count: int):
+    payload = json.dumps({'products': [fixture_product(i) for i in range(1, count + 1)],
+                          'total': count})
+
+    raw = retained_bytes(lambda: json.loads(payload)['products'])
+    parsed = retained_bytes(lambda: [Product.from_api(item) for item in json.loads(payload)['products']])
+
+    print(f"{count} products")
+    print(f"  raw dicts: {raw / count:8.0f} bytes/product")
+    print(f"  Product:   {parsed / count:8.0f} bytes/product ({raw / parsed:.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,77 @@
+'''Check that every hot query uses an index after all migrations are applied
+
+Builds a throwaway database from database.migrations with the standard
+library sqlite3 module and inspects EXPLAIN QUERY PLAN of the query
+constants in database.models. Exits non-zero if a query scans a table or
+sorts through a temporary B-tree. Run from the repository root with either of:
+
+    python -m benchmarks.query_plans
+    python benchmarks/query_plans.py
+'''
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+if __package__ in (None, ''):
+    # Run as a script (python benchmarks/query_plans.py): make the project importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrations import MIGRATIONS, SCHEMA_VERSION_TABLE
+from database.models import (ADD_TO_CART_SQL, CART_TOTAL_SQL, CLEAR_CART_SQL, FSM_LOAD_SQL,
+                             FSM_PURGE_SQL, GET_CART_SQL, GET_USER_SQL, ORDER_BY_KEY_SQL,
+                             REMOVE_FROM_CART_SQL, USER_ORDERS_SQL, USERS_PAGE_SQL, user_filter)
+
+
+def users_page(**filters):
+    '''SQL and parameters of one iter_users() page with the given filters'''
+    where, params = user_filter(**filters)
+    return USERS_PAGE_SQL.format(columns='user_id', where=where), (0, *params, 1000)
+
+
+# (name, SQL, parameters) for the queries on the per-update paths
+HOT_QUERIES = [
+    ('get_user', GET_USER_SQL, (1,)),
+    ('get_cart', GET_CART_SQL, (1,)),
+    ('get_cart_total', CART_TOTAL_SQL, (1,)),
+    ('add_to_cart', ADD_TO_CART_SQL, (1, 1, 'Product', 1.0, 1, None)),
+    ('remove_from_cart', REMOVE_FROM_CART_SQL, (1, 1)),
+    ('clear_cart', CLEAR_CART_SQL, (1,)),
+    ('get_user_orders', USER_ORDERS_SQL, (1,)),
+    ('get_order_by_key', ORDER_BY_KEY_SQL, ('key',)),
+    ('iter_users', *users_page(exclude_blocked=True)),
+    ('iter_users_lang', *users_page(language='uz')),
+    ('iter_users_active', *users_page(active_since=datetime(2024, 1, 1))),
+    ('fsm_load', FSM_LOAD_SQL, ('key',)),
+    ('fsm_purge', FSM_PURGE_SQL, (0.0,)),
+]
+
+INDEXED = ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'USING PRIMARY KEY')
+
+
+def build_schema() -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute(SCHEMA_VERSION_TABLE)
+    for _, _, statements in MIGRATIONS:
+        for statement in statements:
+            conn.execute(statement)
+    conn.execute('ANALYZE')
+    return conn
+
+
+def check(conn: sqlite3.Connection) -> bool:
+    ok = True
+    for name, sql, params in HOT_QUERIES:
+        details = [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        # Plans for writes may include no table access at all (e.g. the UPSERT insert)
+        searches = [detail for detail in details if detail.startswith(('SEARCH', 'SCAN'))]
+        bad = [detail for detail in searches if not any(marker in detail for marker in INDEXED)]
+        bad += [detail for detail in details if 'TEMP B-TREE' in detail]
+        status = 'ok' if not bad else 'FAIL'
+        ok = ok and not bad
+        print(f'{status:>4}  {name:<18} {" | ".join(details) or "(no table access)"}')
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check(build_schema()) else 1)
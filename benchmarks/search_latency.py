@@ -0,0 +1,71 @@
+'''Compare local SearchIndex latency with the upstream /products/search endpoint
+
+Run from the repository root (needs network access to DummyJSON):
+
+    python -m benchmarks.search_latency [rounds]
+'''
+import asyncio
+import statistics
+import sys
+import time
+from typing import List
+from services.api_service import DummyJSONService
+from services.catalog_mirror import CatalogMirror
+from services.search_index import SearchIndex
+
+QUERIES = [
+    'phone', 'iphone', 'laptop', 'apple', 'perfume', 'watch', 'shirt', 'sunglasses',
+    'kitchen', 'lipstick', 'ipohne', 'lapto', 'samsung galaxy', 'ноутбук', "o'yinchoq"
+]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(name: str, samples: List[float]):
+    print(f"{name:>9}: n={len(samples)} "
+          f"p50={percentile(samples, 50) * 1000:.3f}ms "
+          f"p99={percentile(samples, 99) * 1000:.3f}ms "
+          f"mean={statistics.mean(samples) * 1000:.3f}ms")
+
+
+async def main(rounds: int):
+    api = DummyJSONService()
+    mirror = CatalogMirror(api)
+    index = SearchIndex()
+    try:
+        if not await mirror.sync():
+            print("Could not load the catalog from DummyJSON")
+            return
+        started = time.perf_counter()
+        index.rebuild(mirror.all_products())
+        print(f"Indexed {len(index)} products in {(time.perf_counter() - started) * 1000:.1f}ms "
+              f"({index.stats()['terms']} terms)")
+
+        local = []
+        for _ in range(rounds):
+            for query in QUERIES:
+                started = time.perf_counter()
+                index.search(query)
+                local.append(time.perf_counter() - started)
+
+        upstream = []
+        for _ in range(min(rounds, 5)):
+            # Measure real round trips, not response-cache hits
+            api.cache.invalidate()
+            for query in QUERIES:
+                started = time.perf_counter()
+                await api.search_products(query)
+                upstream.append(time.perf_counter() - started)
+
+        report('local', local)
+        report('upstream', upstream)
+    finally:
+        await api.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
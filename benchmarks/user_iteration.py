@@ -0,0 +1,75 @@
+'''Peak memory of loading every user ID vs streaming users with iter_users()
+
+Grows a throwaway users table and, at each size, compares the old
+fetchall() of every user_id with Database.iter_users(). The streaming
+peak should stay flat while fetchall() grows with the table. Run from the
+repository root:
+
+    python -m benchmarks.user_iteration [sizes...]
+'''
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from config import SQLITE_PRAGMAS
+from database.models import Database
+
+
+async def grow(db: Database, size: int):
+    '''Add users until the table has size rows'''
+    async with db.writer() as conn:
+        await conn.execute('''
+            WITH RECURSIVE ids(user_id) AS (
+                SELECT COALESCE(MAX(user_id), 0) + 1 FROM users
+                UNION ALL SELECT user_id + 1 FROM ids WHERE user_id < ?
+            )
+            INSERT INTO users (user_id, first_name, last_name, email, phone, language)
+            SELECT user_id, 'First', 'Last', 'user@example.com', '+998900000000',
+                   CASE user_id % 3 WHEN 0 THEN 'uz' WHEN 1 THEN 'ru' ELSE 'en' END
+            FROM ids
+        ''', (size,))
+
+
+async def fetch_all(db: Database) -> int:
+    '''The pre-streaming approach: every user_id in one list'''
+    async with db.reader() as conn:
+        async with conn.execute('SELECT user_id FROM users') as cursor:
+            user_ids = [row[0] for row in await cursor.fetchall()]
+    return len(user_ids)
+
+
+async def stream(db: Database) -> int:
+    count = 0
+    async for _ in db.iter_users(exclude_blocked=True):
+        count += 1
+    return count
+
+
+async def measure(name: str, run, db: Database, size: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = await run(db)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{size:>10,} users  {name:<9} {count:>10,} rows  "
+          f"peak {peak / 1024 / 1024:8.2f} MiB  {elapsed:6.2f}s")
+
+
+async def main(sizes):
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, 'bench.db'), pragmas=SQLITE_PRAGMAS,
+                      checkpoint_interval=0)
+        await db.connect()
+        await db.init_db()
+        for size in sizes:
+            await grow(db, size)
+            await measure('fetchall', fetch_all, db, size)
+            await measure('stream', stream, db, size)
+        await db.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main([int(size) for size in sys.argv[1:]] or [10_000, 100_000, 1_000_000]))
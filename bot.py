@@ -1,9 +1,30 @@
 import asyncio
 import logging
+from typing import Optional
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN, DATABASE_PATH
+from config import (BOT_TOKEN, BOT_MODE, DATABASE_PATH, DB_POOL_READERS, USER_CACHE_SIZE, USER_CACHE_TTL,
+                    SQLITE_PRAGMAS, SQLITE_CHECKPOINT_INTERVAL, CATALOG_PAGE_SIZE, CATALOG_SYNC_INTERVAL,
+                    FSM_STORAGE, FSM_STATE_TTL, FSM_FLUSH_INTERVAL, REDIS_URL,
+                    SESSION_STORE_SIZE, SESSION_TTL, PRODUCT_STORE_SIZE, PRODUCT_STORE_TTL,
+                    BROADCAST_WORKERS, BROADCAST_RATE, BROADCAST_PER_CHAT_INTERVAL,
+                    BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL, BROADCAST_WATCH_INTERVAL,
+                    COALESCED_CALLBACKS)
 from database.models import Database
+from database.fsm_storage import SQLiteStorage
+from services.api_service import DummyJSONService
+from services.broadcast import BroadcastEngine
+from services.catalog_mirror import CatalogMirror
+from services.search_index import SearchIndex
+from services.session_store import ProductStore, SessionStore
+from keyboards.inline import clear_categories_cache, keyboard_cache_stats
+from middlewares.dependencies import DependencyMiddleware
+from middlewares.menu import MenuTextMiddleware
+from middlewares.user_lock import UserLockMiddleware
+from middlewares.user_profile import UserProfileMiddleware
+from webhook import run_webhook
 
 # Import handlers
 from handlers import start, registration, catalog, cart, checkout, search, admin, orders
@@ -15,18 +36,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def main():
-    '''Main bot entry point'''
+def create_fsm_storage(db: Database) -> BaseStorage:
+    '''FSM storage backend selected by FSM_STORAGE'''
+    if FSM_STORAGE == 'sqlite':
+        return SQLiteStorage(db, ttl=FSM_STATE_TTL, flush_interval=FSM_FLUSH_INTERVAL)
+    if FSM_STORAGE == 'redis':
+        # Optional dependency (redis package), only imported when selected
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+    return MemoryStorage()
+
+async def on_startup(db: Database, api: DummyJSONService, mirror: CatalogMirror,
+                     broadcaster: BroadcastEngine):
+    '''Open shared resources before the first update is processed'''
+    await db.connect()
+    applied = await db.init_db()
+    logger.info("Database initialized successfully (migrations applied: %s)", applied or 'none')
+    await api.start()
+    await mirror.start()
+    # Resume broadcasts interrupted by the last shutdown
+    await broadcaster.start()
+
+async def on_shutdown(db: Database, api: DummyJSONService, mirror: CatalogMirror,
+                      sessions: SessionStore, products_store: ProductStore,
+                      broadcaster: BroadcastEngine, user_locks: UserLockMiddleware,
+                      dispatcher: Dispatcher):
+    '''Release shared resources once polling has stopped'''
+    # Running broadcasts save their progress and resume on the next start
+    await broadcaster.close()
+    if isinstance(dispatcher.storage, SQLiteStorage):
+        # Write out batched state before the database closes
+        await dispatcher.storage.close()
+        logger.info("FSM storage stats: %s", dispatcher.storage.stats())
+    await mirror.close()
+    logger.info("User lock stats: %s", user_locks.stats())
+    logger.info("Catalog mirror stats: %s", mirror.stats())
+    logger.info("Session store stats: %s", sessions.stats())
+    logger.info("Product store stats: %s", products_store.stats())
+    logger.info("Keyboard cache stats: %s", keyboard_cache_stats())
+    logger.info("API cache stats: %s", api.cache_stats())
+    await api.close()
+    logger.info("Database pool stats: %s", db.pool_stats())
+    logger.info("User cache stats: %s", db.cache_stats())
+    await db.close()
+
+def create_bot(session: Optional[BaseSession] = None, database_path: str = DATABASE_PATH,
+               cluster_worker: Optional[int] = None):
+    '''Build the bot, the dispatcher and the dependencies handed to handlers
+
+    ``cluster_worker`` is this process's index in cluster mode (cluster.py);
+    only worker 0 sends broadcasts.
+    '''
+    # Shared objects handed to every handler by the dependency middleware
+    db = Database(database_path, pool_readers=DB_POOL_READERS,
+                  user_cache_size=USER_CACHE_SIZE, user_cache_ttl=USER_CACHE_TTL,
+                  pragmas=SQLITE_PRAGMAS, checkpoint_interval=SQLITE_CHECKPOINT_INTERVAL)
 
     # Initialize bot and dispatcher
-    bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
+    bot = Bot(token=BOT_TOKEN, session=session)
+    storage = create_fsm_storage(db)
     dp = Dispatcher(storage=storage)
+    api = DummyJSONService()
+    mirror = CatalogMirror(api, page_size=CATALOG_PAGE_SIZE, sync_interval=CATALOG_SYNC_INTERVAL)
+    search_index = SearchIndex()
+    mirror.add_listener(lambda synced: search_index.rebuild(synced.all_products()))
+    mirror.add_listener(lambda synced: clear_categories_cache())
+    products_store = ProductStore(mirror, maxsize=PRODUCT_STORE_SIZE, ttl=PRODUCT_STORE_TTL)
+    sessions = SessionStore(maxsize=SESSION_STORE_SIZE, ttl=SESSION_TTL)
+    broadcaster = BroadcastEngine(bot, db, workers=BROADCAST_WORKERS, rate=BROADCAST_RATE,
+                                  per_chat_interval=BROADCAST_PER_CHAT_INTERVAL,
+                                  max_retries=BROADCAST_MAX_RETRIES,
+                                  progress_interval=BROADCAST_PROGRESS_INTERVAL,
+                                  run_jobs=cluster_worker in (None, 0),
+                                  watch_interval=BROADCAST_WATCH_INTERVAL if cluster_worker == 0 else None)
+    user_locks = UserLockMiddleware(coalesce=COALESCED_CALLBACKS)
+    dependencies = {'db': db, 'api': api, 'mirror': mirror, 'search_index': search_index,
+                    'products_store': products_store, 'sessions': sessions,
+                    'broadcaster': broadcaster, 'user_locks': user_locks}
 
-    # Initialize database
-    db = Database(DATABASE_PATH)
-    await db.init_db()
-    logger.info("Database initialized successfully")
+    # Per-user lock goes before the FSM middleware so state is read under it
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(user_locks)
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(DependencyMiddleware(**dependencies))
+    dp.update.outer_middleware(UserProfileMiddleware())
+    dp.message.outer_middleware(MenuTextMiddleware())
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
     # Register routers
     dp.include_router(start.router)
@@ -39,11 +135,21 @@ async def main():
     dp.include_router(orders.router)
 
     logger.info("All handlers registered")
+    return bot, dp, dependencies
+
+async def main():
+    '''Main bot entry point'''
+    bot, dp, dependencies = create_bot()
+
+    if BOT_MODE == 'webhook':
+        await run_webhook(bot, dp, dependencies)
+        return
 
     # Start polling
     try:
         logger.info("Bot started successfully!")
-        await dp.start_polling(bot)
+        await bot.delete_webhook()
+        await dp.start_polling(bot, **dependencies)
     finally:
         await bot.session.close()
 
@@ -51,4 +157,4 @@ if __name__ == '__main__':
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        logger.info("Bot stopped")
\ No newline at end of file
+        logger.info("Bot stopped")
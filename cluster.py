@@ -0,0 +1,316 @@
+'''Cluster mode: one front process, N worker processes running the bot
+
+The front process receives updates (long polling, or the webhook server
+when BOT_MODE=webhook) and routes each one to a worker by hashing the
+sender's user id, so every update of a user is handled by the same worker;
+there UserLockMiddleware keeps them in arrival order while different users
+are handled concurrently.
+
+Shared state and why it stays consistent across workers:
+
+- SQLite (orders, carts, users, FSM state) is shared through the database
+  file; WAL mode and BEGIN IMMEDIATE transactions make concurrent writers
+  from several processes safe.
+- FSM sessions, user profiles, browse/search sessions and products are
+  cached per worker. Routing is sticky, so a user's cached entries only
+  change in the worker that owns the user. The one cross-worker write,
+  a broadcast marking users as blocked, reaches other workers' profile
+  caches within USER_CACHE_TTL.
+- Broadcasts are sent by worker 0 only; other workers just create the job
+  (see BroadcastEngine.run_jobs).
+- The catalog mirror and API cache are per worker.
+
+Run with ``python cluster.py``; CLUSTER_WORKERS sets the worker count.
+'''
+import asyncio
+import json
+import logging
+import multiprocessing
+import secrets
+import signal
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramAPIError
+from bot import create_bot
+from config import (BOT_MODE, CLUSTER_WORKERS, CLUSTER_MAX_PENDING, API_JSON_DECODER,
+                    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+                    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_SHUTDOWN_TIMEOUT)
+from services.json_decoding import JSONDecoder
+
+logger = logging.getLogger(__name__)
+
+POLLING_TIMEOUT = 30  # Seconds a getUpdates long poll is held open
+SUPERVISE_INTERVAL = 5  # Seconds between checks for dead workers
+
+
+def route_key(update: Dict[str, Any]) -> int:
+    '''The id an update is routed by: its sender, else its chat, else the update itself'''
+    for field, event in update.items():
+        if field == 'update_id' or not isinstance(event, dict):
+            continue
+        sender = event.get('from') or event.get('user') or event.get('chat')
+        if sender is None and isinstance(event.get('message'), dict):
+            sender = event['message'].get('chat')
+        if sender is not None:
+            return sender['id']
+    return update['update_id']
+
+
+# ============ WORKER ============
+
+class UpdateFeeder:
+    '''Feeds raw updates to the dispatcher as concurrent tasks, at most max_pending at once
+
+    Tasks are created in arrival order and reach UserLockMiddleware's FIFO
+    per-user lock in that order, which keeps each user's updates in order.
+    '''
+
+    def __init__(self, bot: Bot, dp: Dispatcher, dependencies: Dict[str, Any],
+                 max_pending: int = 1000):
+        self.bot = bot
+        self.dp = dp
+        self.dependencies = dependencies
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tasks: Set[asyncio.Task] = set()
+        self.handled = 0
+
+    async def feed(self, update: Dict[str, Any]):
+        '''Schedule an update; waits while max_pending updates are being handled'''
+        await self._slots.acquire()
+        task = asyncio.create_task(self._handle(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, update: Dict[str, Any]):
+        try:
+            await self.dp.feed_raw_update(self.bot, update, **self.dependencies)
+        except Exception as e:
+            logger.exception("Update %s failed: %s", update.get('update_id'), e)
+        finally:
+            self.handled += 1
+            self._slots.release()
+
+    async def drain(self):
+        '''Wait for every scheduled update'''
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def _run_worker(index: int, queue: multiprocessing.Queue, ready,
+                      bot_options: Dict[str, Any]):
+    bot, dp, dependencies = create_bot(cluster_worker=index, **bot_options)
+    workflow_data = {'bot': bot, 'dispatcher': dp, **dp.workflow_data, **dependencies}
+    await dp.emit_startup(**workflow_data)
+    feeder = UpdateFeeder(bot, dp, dependencies, max_pending=CLUSTER_MAX_PENDING)
+    loop = asyncio.get_running_loop()
+    ready.set()
+    try:
+        while True:
+            batch = await loop.run_in_executor(None, queue.get)
+            if batch is None:
+                break
+            for update in batch:
+                await feeder.feed(update)
+        await feeder.drain()
+    finally:
+        logger.info("Worker %s handled %s updates", index, feeder.handled)
+        await dp.emit_shutdown(**workflow_data)
+        await bot.session.close()
+
+
+def run_worker(index: int, queue: multiprocessing.Queue, ready, bot_options: Dict[str, Any]):
+    '''Worker process entry point; stops after the front sends None'''
+    # Ctrl+C reaches the whole process group: let the front shut workers down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, queue, ready, bot_options))
+
+
+# ============ FRONT ============
+
+class Cluster:
+    '''Starts the workers and routes batches of raw updates to them
+
+    ``bot_options`` are passed to create_bot() in each worker and must be
+    picklable (workers are started with the spawn method).
+    '''
+
+    def __init__(self, workers: int, bot_options: Optional[Dict[str, Any]] = None):
+        self.workers = workers
+        self.bot_options = bot_options or {}
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = [self._context.Queue() for _ in range(workers)]
+        self._processes: List[multiprocessing.Process] = []
+        self._supervisor: Optional[asyncio.Task] = None
+        self.routed = 0
+
+    def _spawn(self, index: int) -> Tuple[multiprocessing.Process, Any]:
+        ready = self._context.Event()
+        process = self._context.Process(target=run_worker, name=f'worker-{index}', daemon=False,
+                                        args=(index, self._queues[index], ready, self.bot_options))
+        process.start()
+        return process, ready
+
+    async def start(self):
+        '''Start the workers and wait until each has run its startup hooks'''
+        started = [self._spawn(index) for index in range(self.workers)]
+        self._processes = [process for process, _ in started]
+        loop = asyncio.get_running_loop()
+        for _, ready in started:
+            await loop.run_in_executor(None, ready.wait)
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info("Cluster started with %s workers", self.workers)
+
+    async def _supervise(self):
+        '''Restart workers that died; their queued updates are kept'''
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error("Worker %s exited with %s, restarting", index, process.exitcode)
+                    self._processes[index], _ = self._spawn(index)
+
+    @property
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self._processes)
+
+    def route(self, updates: List[Dict[str, Any]]):
+        '''Hand updates to their workers, one queue put per worker'''
+        batches: Dict[int, List[Dict[str, Any]]] = {}
+        for update in updates:
+            batches.setdefault(route_key(update) % self.workers, []).append(update)
+        for index, batch in batches.items():
+            self._queues[index].put(batch)
+        self.routed += len(updates)
+
+    async def stop(self, timeout: float = WEBHOOK_SHUTDOWN_TIMEOUT):
+        '''Let workers finish their queues and shut down'''
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+        for queue in self._queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for index, process in enumerate(self._processes):
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning("Worker %s did not stop in %ss, terminating", index, timeout)
+                process.terminate()
+        logger.info("Cluster stopped after routing %s updates", self.routed)
+
+
+async def poll(bot: Bot, allowed_updates: List[str], route: Callable[[List[Dict[str, Any]]], None],
+               loads: Callable[[bytes], Any]):
+    '''Long-poll getUpdates and route raw updates without parsing them into objects'''
+    url = bot.session.api.api_url(bot.token, 'getUpdates')
+    params: Dict[str, Any] = {'timeout': POLLING_TIMEOUT, 'allowed_updates': json.dumps(allowed_updates)}
+    timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+    backoff = 1.0
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        try:
+            while True:
+                try:
+                    async with http.get(url, params=params) as response:
+                        data = loads(await response.read())
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning("getUpdates failed: %s, retrying in %ss", e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                if not data.get('ok'):
+                    retry_after = data.get('parameters', {}).get('retry_after', backoff)
+                    logger.warning("getUpdates error: %s", data.get('description'))
+                    await asyncio.sleep(retry_after)
+                    continue
+
+                backoff = 1.0
+                updates = data['result']
+                if updates:
+                    route(updates)
+                    params['offset'] = updates[-1]['update_id'] + 1
+        finally:
+            if 'offset' in params:
+                # Confirm the updates already routed so they are not delivered again
+                try:
+                    async with http.get(url, params={'offset': params['offset'], 'timeout': 0,
+                                                     'limit': 1}):
+                        pass
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning("Could not confirm the last updates: %s", e)
+
+
+def create_front_app(cluster: Cluster, loads: Callable[[bytes], Any]) -> web.Application:
+    '''Webhook endpoint that routes updates to workers, plus GET /healthz'''
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set in webhook mode")
+
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not secrets.compare_digest(token, WEBHOOK_SECRET):
+            return web.Response(body="Unauthorized", status=401)
+        cluster.route([loads(await request.read())])
+        return web.json_response({})
+
+    async def healthz(request: web.Request) -> web.Response:
+        healthy = cluster.alive == cluster.workers
+        body = {'status': 'ok' if healthy else 'degraded', 'workers': cluster.workers,
+                'alive': cluster.alive, 'routed': cluster.routed}
+        return web.json_response(body, status=200 if healthy else 503)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle)
+    app.router.add_get('/healthz', healthz)
+    return app
+
+
+async def main():
+    # Only used to call the Bot API and to know which update types handlers use
+    bot, dp, _ = create_bot()
+    loads = JSONDecoder(API_JSON_DECODER).loads
+    cluster = Cluster(CLUSTER_WORKERS)
+    await cluster.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    runner = None
+    source = None
+    try:
+        if BOT_MODE == 'webhook':
+            runner = web.AppRunner(create_front_app(cluster, loads), handle_signals=False)
+            await runner.setup()
+            await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+            if WEBHOOK_BASE_URL:
+                await bot.set_webhook(WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH,
+                                      secret_token=WEBHOOK_SECRET,
+                                      max_connections=WEBHOOK_MAX_CONNECTIONS,
+                                      allowed_updates=dp.resolve_used_update_types())
+            logger.info("Routing webhook updates from %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        else:
+            await bot.delete_webhook()
+            source = asyncio.create_task(poll(bot, dp.resolve_used_update_types(), cluster.route, loads))
+            logger.info("Routing polled updates")
+        await stop.wait()
+    except TelegramAPIError as e:
+        logger.error("Telegram API error: %s", e)
+    finally:
+        logger.info("Shutting down cluster")
+        if source is not None:
+            source.cancel()
+            await asyncio.gather(source, return_exceptions=True)
+        if runner is not None:
+            await runner.cleanup()
+        await cluster.stop()
+        await bot.session.close()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Cluster stopped")
@@ -7,11 +7,89 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if id.strip()]
 
+# How updates arrive: 'polling' (getUpdates) or 'webhook' (aiohttp server, see webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')  # Public https URL; empty = don't call setWebhook
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # Checked against X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_MAX_CONNECTIONS = 40  # Concurrent update deliveries Telegram may open
+WEBHOOK_SHUTDOWN_TIMEOUT = 30  # Seconds in-flight updates get to finish on shutdown
+
+# Cluster mode (python cluster.py): a front process receives updates and routes
+# them by user to worker processes, each running the full bot
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', str(os.cpu_count() or 2)))
+CLUSTER_MAX_PENDING = 1000  # Updates a worker handles at once before reading more
+
+# Callbacks where only the newest of a burst from one user is handled (page buttons)
+COALESCED_CALLBACKS = ('page_', 'search_page_')
+
 # Database configuration
 DATABASE_PATH = 'shop_database.db'
+DB_POOL_READERS = int(os.getenv('DB_POOL_READERS', '4'))  # Reader connections kept open
+USER_CACHE_SIZE = 10000  # Cached user profiles
+USER_CACHE_TTL = 600  # Seconds before a cached profile is re-read
+
+# Applied in order to every SQLite connection when it is opened
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers never block the writer and vice versa
+    'synchronous': 'NORMAL',  # fsync on checkpoint only; safe with WAL
+    'busy_timeout': 5000,  # Milliseconds to wait for a lock held by another process
+    'mmap_size': 64 * 1024 * 1024,  # Bytes of the file read through memory mapping
+    'cache_size': -16000,  # Page cache per connection (negative = KiB)
+    'temp_store': 'MEMORY'  # Sorts and temp indexes stay off disk
+}
+SQLITE_CHECKPOINT_INTERVAL = 300  # Seconds between background WAL checkpoints
+
+# FSM storage backend: 'sqlite' (shop database), 'redis' or 'memory' (lost on restart)
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'sqlite')
+FSM_STATE_TTL = 86400  # Seconds before an abandoned registration or checkout is dropped
+FSM_FLUSH_INTERVAL = 0.5  # Seconds state writes are batched before reaching SQLite
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')  # Any Redis-compatible server
 
 # API configuration
 DUMMYJSON_API_URL = 'https://dummyjson.com'
+API_TIMEOUT = 10  # Seconds for a whole request, including reading the body
+API_CONNECT_TIMEOUT = 5  # Seconds to establish a connection
+API_CONNECTION_LIMIT = 100  # Pooled connections in total
+API_CONNECTION_LIMIT_PER_HOST = 30  # Pooled connections to the API host
+API_KEEPALIVE_TIMEOUT = 30  # Seconds an idle keep-alive connection is kept
+API_DNS_CACHE_TTL = 300  # Seconds a resolved address is reused
+# Response decoder: 'auto' picks msgspec, then orjson, then the stdlib json module
+API_JSON_DECODER = os.getenv('API_JSON_DECODER', 'auto')
+
+# API response cache (seconds an entry is fresh, per endpoint kind)
+API_CACHE_SIZE = 512
+API_CACHE_TTL = {
+    'categories': 3600,
+    'products': 300,
+    'product': 300,
+    'search': 120
+}
+API_CACHE_STALE_TTL = 600  # Extra seconds a stale entry is served while refreshing
+
+# Local catalog mirror
+CATALOG_PAGE_SIZE = 100  # Products per request during a full sync
+CATALOG_SYNC_INTERVAL = 900  # Seconds between background syncs
+PRODUCT_FRESHNESS_SECONDS = 1800  # Older local product data is re-checked upstream on add to cart
+
+# Browse/search paging sessions (product ids only) and the product cache they reference
+SESSION_STORE_SIZE = 10000  # Sessions kept before the least recently used is evicted
+SESSION_TTL = 3600  # Seconds an untouched session is kept
+PRODUCT_STORE_SIZE = 5000  # Products kept outside the catalog mirror
+PRODUCT_STORE_TTL = 3600
+
+# Pre-rendered keyboard markups kept per keyboard kind (language, page, category list...)
+KEYBOARD_CACHE_SIZE = 1024
+
+# Broadcasts (Telegram allows about 30 messages/s overall and 1 message/s per chat)
+BROADCAST_WORKERS = 8  # Concurrent send workers per broadcast
+BROADCAST_RATE = 25  # Messages per second across all broadcasts
+BROADCAST_PER_CHAT_INTERVAL = 1.0  # Minimum seconds between messages to one chat
+BROADCAST_MAX_RETRIES = 3  # Flood-control retries per recipient
+BROADCAST_PROGRESS_INTERVAL = 5  # Seconds between progress saves and admin message edits
+BROADCAST_WATCH_INTERVAL = 5  # Cluster mode: seconds before worker 0 picks up jobs from other workers
 
 # Promo code configuration
 PROMO_CODE = 'HELLO'
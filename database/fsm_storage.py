@@ -0,0 +1,250 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Set, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.models import FSM_LOAD_SQL, FSM_PURGE_SQL, Database
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    '''In-memory copy of one FSM row'''
+    __slots__ = ('state', 'data', 'touched')
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], touched: float):
+        self.state = state
+        self.data = data
+        self.touched = touched
+
+
+class SQLiteStorage(BaseStorage):
+    '''aiogram FSM storage kept in the shop database
+
+    Once a key has been read its session stays in memory, so state filters
+    on later updates need no query. Writes change that copy and mark the key
+    dirty; dirty keys are written with one ``executemany`` every
+    ``flush_interval`` seconds (or as soon as ``max_pending`` keys wait), so
+    the several ``update_data`` calls of a handler cost a single row write.
+    ``flush_interval=0`` writes through on every call. A failed background
+    flush keeps the keys dirty and is retried after a delay that doubles on
+    each failure, up to ``max_retry_interval`` seconds.
+
+    Sessions untouched for ``ttl`` seconds read as empty and are deleted
+    every ``purge_interval`` seconds.
+
+    The in-memory copy assumes each chat is handled by one process at a time
+    (a single bot process, or the per-user routing of cluster mode).
+    '''
+
+    def __init__(self, db: Database, ttl: float = 86400, flush_interval: float = 0.5,
+                 max_pending: int = 256, cache_size: int = 10000, purge_interval: float = 3600,
+                 max_retry_interval: float = 30):
+        self.db = db
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        self.max_retry_interval = max_retry_interval
+        self._sessions: 'OrderedDict[str, _Session]' = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._stats = {
+            'reads': 0,
+            'hits': 0,
+            'loads': 0,
+            'writes': 0,
+            'flushes': 0,
+            'rows_flushed': 0,
+            'flush_errors': 0,
+            'purged': 0
+        }
+
+    @staticmethod
+    def _name(key: StorageKey) -> str:
+        parts = (key.bot_id, key.chat_id, key.user_id, key.thread_id,
+                 getattr(key, 'business_connection_id', None), key.destiny)
+        return ':'.join('' if part is None else str(part) for part in parts)
+
+    def _expired(self, touched: float) -> bool:
+        return time.time() - touched > self.ttl
+
+    async def _session(self, key: StorageKey) -> Tuple[str, _Session]:
+        '''Cached session for a key, loading it from the database on a miss'''
+        name = self._name(key)
+        self._stats['reads'] += 1
+        if self._purge_task is None and not self._closed and self.purge_interval > 0:
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+        session = self._sessions.get(name)
+        if session is not None:
+            if self._expired(session.touched) and name not in self._dirty:
+                session = self._sessions[name] = _Session(None, {}, time.time())
+            self._sessions.move_to_end(name)
+            self._stats['hits'] += 1
+            return name, session
+
+        self._stats['loads'] += 1
+        async with self.db.reader() as db:
+            async with db.execute(FSM_LOAD_SQL, (name,)) as cursor:
+                row = await cursor.fetchone()
+
+        # Another coroutine may have loaded or written the key meanwhile
+        session = self._sessions.get(name)
+        if session is None:
+            if row and not self._expired(row['updated_at']):
+                session = _Session(row['state'], json.loads(row['data']), row['updated_at'])
+            else:
+                session = _Session(None, {}, time.time())
+            self._sessions[name] = session
+            self._evict()
+        return name, session
+
+    async def _written(self, name: str, session: _Session):
+        '''Mark a changed session for the next flush'''
+        session.touched = time.time()
+        self._dirty.add(name)
+        self._stats['writes'] += 1
+        if self.flush_interval <= 0 or len(self._dirty) >= self.max_pending or self._closed:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self, delay: Optional[float] = None):
+        delay = self.flush_interval if delay is None else delay
+        await asyncio.sleep(delay)
+        # Writes arriving during the flush schedule the next one
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self._stats['flush_errors'] += 1
+            retry = min(max(delay, self.flush_interval) * 2, self.max_retry_interval)
+            logger.warning("FSM storage flush failed, will retry in %.1fs: %s", retry, e)
+            if self._flush_task is None and not self._closed:
+                self._flush_task = asyncio.create_task(self._delayed_flush(retry))
+
+    async def flush(self):
+        '''Write every dirty session to the database in one transaction'''
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            names, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            for name in names:
+                session = self._sessions[name]
+                if session.state is None and not session.data:
+                    deletes.append((name,))
+                else:
+                    upserts.append((name, session.state, json.dumps(session.data), session.touched))
+
+            try:
+                async with self.db.writer() as db:
+                    if upserts:
+                        await db.executemany('''
+                            INSERT INTO fsm_storage (key, state, data, updated_at)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT (key) DO UPDATE SET
+                                state = excluded.state,
+                                data = excluded.data,
+                                updated_at = excluded.updated_at
+                        ''', upserts)
+                    if deletes:
+                        await db.executemany('DELETE FROM fsm_storage WHERE key = ?', deletes)
+            except BaseException:
+                # Keep the sessions dirty so a later flush retries them
+                self._dirty |= names
+                raise
+
+            self._stats['flushes'] += 1
+            self._stats['rows_flushed'] += len(names)
+            self._evict()
+
+    def _evict(self):
+        '''Drop least recently used clean sessions beyond cache_size'''
+        if len(self._sessions) <= self.cache_size:
+            return
+        for name in list(self._sessions):
+            if len(self._sessions) <= self.cache_size:
+                break
+            if name not in self._dirty:
+                del self._sessions[name]
+
+    async def purge_expired(self) -> int:
+        '''Delete sessions untouched for longer than ttl; returns rows deleted'''
+        cutoff = time.time() - self.ttl
+        for name in [name for name, session in self._sessions.items()
+                     if session.touched < cutoff and name not in self._dirty]:
+            del self._sessions[name]
+
+        async with self.db.writer() as db:
+            cursor = await db.execute(FSM_PURGE_SQL, (cutoff,))
+            purged = cursor.rowcount
+        self._stats['purged'] += purged
+        return purged
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                logger.warning("FSM storage purge failed: %s", e)
+
+    # ============ BaseStorage API ============
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        name, session = await self._session(key)
+        session.state = state.state if isinstance(state, State) else state
+        await self._written(name, session)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        _, session = await self._session(key)
+        return session.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        name, session = await self._session(key)
+        session.data = copy.deepcopy(dict(data))
+        await self._written(name, session)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, session = await self._session(key)
+        return copy.deepcopy(session.data)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        name, session = await self._session(key)
+        session.data.update(copy.deepcopy(dict(data)))
+        await self._written(name, session)
+        return copy.deepcopy(session.data)
+
+    async def close(self) -> None:
+        '''Stop background tasks and write out pending sessions (idempotent)'''
+        if self._closed:
+            return
+        self._closed = True
+        for task in (self._flush_task, self._purge_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._flush_task = self._purge_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Final FSM storage flush failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        '''Read, cache and flush counters'''
+        return dict(self._stats, sessions=len(self._sessions), pending=len(self._dirty))
@@ -0,0 +1,184 @@
+import aiosqlite
+from typing import List, Tuple
+
+# Ordered schema migrations: (version, description, SQL statements).
+# Append new steps with the next version number; never edit an applied one.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, 'base tables', [
+        # Users table - stores user registration data
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            language TEXT DEFAULT 'uz',
+            promo_used INTEGER DEFAULT 0,
+            is_admin INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Cart table - stores shopping cart items
+        '''
+        CREATE TABLE IF NOT EXISTS cart (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER DEFAULT 1,
+            image TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        ''',
+        # Orders table - stores completed orders
+        '''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            total_amount REAL NOT NULL,
+            discount_amount REAL DEFAULT 0,
+            final_amount REAL NOT NULL,
+            payment_method TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        ''',
+        # Order items table - stores individual items in each order
+        '''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders(id)
+        )
+        '''
+    ]),
+    (2, 'one cart row per user and product', [
+        # Merge duplicate rows left by the old read-then-insert add_to_cart
+        '''
+        UPDATE cart SET quantity = (
+            SELECT SUM(dup.quantity) FROM cart AS dup
+            WHERE dup.user_id = cart.user_id AND dup.product_id = cart.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        )
+        ''',
+        '''
+        DELETE FROM cart WHERE id NOT IN (
+            SELECT MIN(id) FROM cart GROUP BY user_id, product_id
+        )
+        ''',
+        # Backs the cart UPSERT and every per-user cart query
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_user_product
+        ON cart (user_id, product_id)
+        '''
+    ]),
+    (3, 'indexes for order history and order items', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_orders_user_created
+        ON orders (user_id, created_at DESC)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_order_items_order
+        ON order_items (order_id)
+        '''
+    ]),
+    (4, 'idempotency key for checkout submissions', [
+        'ALTER TABLE orders ADD COLUMN idempotency_key TEXT',
+        # One order per checkout session; NULL keys (older orders) never collide
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency_key
+        ON orders (idempotency_key)
+        '''
+    ]),
+    (5, 'persistent FSM storage', [
+        # One row per aiogram storage key; data is the JSON-encoded state data
+        '''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        # Backs the purge of abandoned sessions
+        '''
+        CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated
+        ON fsm_storage (updated_at)
+        '''
+    ]),
+    (6, 'blocked users and resumable broadcast jobs', [
+        # Set when a broadcast finds the user has blocked the bot
+        'ALTER TABLE users ADD COLUMN is_blocked INTEGER DEFAULT 0',
+        # One row per broadcast; last_user_id is the resume point after a restart
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            lang TEXT NOT NULL,
+            from_chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            progress_message_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        '''
+    ]),
+    (7, 'index for streaming users by language', [
+        # Keyset pages of one language: WHERE language = ? AND user_id > ?
+        '''
+        CREATE INDEX IF NOT EXISTS idx_users_language
+        ON users (language, user_id)
+        '''
+    ])
+]
+
+SCHEMA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    '''Highest applied migration version (0 for a fresh database)'''
+    async with db.execute('SELECT MAX(version) FROM schema_version') as cursor:
+        row = await cursor.fetchone()
+        return row[0] or 0
+
+async def apply_migrations(db: aiosqlite.Connection) -> List[int]:
+    '''Apply every pending migration in order; returns the versions applied
+
+    Runs in the caller's transaction, so a failing step leaves the schema
+    at the previous version once the caller rolls back.
+    '''
+    await db.execute(SCHEMA_VERSION_TABLE)
+    current = await get_schema_version(db)
+
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements:
+            await db.execute(statement)
+        await db.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                         (version, description))
+        applied.append(version)
+    return applied
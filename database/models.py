@@ -1,77 +1,130 @@
+import asyncio
 import sqlite3
 import aiosqlite
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Sequence, Tuple
+from database.pool import ConnectionPool
+from database.migrations import apply_migrations
+from utils.cache import TTLCache
+
+# Marks a cached lookup that found no registered user
+_NO_USER = object()
+
+# Queries on the per-update paths, shared with benchmarks/query_plans.py,
+# which checks that each of them is answered from an index
+GET_USER_SQL = 'SELECT * FROM users WHERE user_id = ?'
+ADD_TO_CART_SQL = '''
+    INSERT INTO cart (user_id, product_id, title, price, quantity, image)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, product_id)
+    DO UPDATE SET quantity = quantity + excluded.quantity
+'''
+GET_CART_SQL = 'SELECT * FROM cart WHERE user_id = ?'
+REMOVE_FROM_CART_SQL = 'DELETE FROM cart WHERE user_id = ? AND product_id = ?'
+CLEAR_CART_SQL = 'DELETE FROM cart WHERE user_id = ?'
+CART_TOTAL_SQL = 'SELECT SUM(price * quantity) as total FROM cart WHERE user_id = ?'
+ORDER_BY_KEY_SQL = 'SELECT * FROM orders WHERE idempotency_key = ?'
+USER_ORDERS_SQL = 'SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC'
+# One keyset page of users; {where} comes from user_filter()
+USERS_PAGE_SQL = '''
+    SELECT {columns} FROM users
+    WHERE user_id > ? AND {where}
+    ORDER BY user_id LIMIT ?
+'''
+# FSM sessions (database/fsm_storage.py)
+FSM_LOAD_SQL = 'SELECT state, data, updated_at FROM fsm_storage WHERE key = ?'
+FSM_PURGE_SQL = 'DELETE FROM fsm_storage WHERE updated_at < ?'
+
+# Columns iter_users() may return
+USER_FIELDS = {'user_id', 'first_name', 'last_name', 'email', 'phone', 'language',
+               'promo_used', 'is_admin', 'is_blocked', 'created_at'}
+
+
+def user_filter(language: Optional[str] = None, exclude_blocked: bool = False,
+                active_since: Optional[datetime] = None) -> Tuple[str, list]:
+    '''WHERE conditions (joined with AND) and parameters for user queries'''
+    conditions, params = [], []
+    if language is not None:
+        conditions.append('language = ?')
+        params.append(language)
+    if exclude_blocked:
+        conditions.append('is_blocked = 0')
+    if active_since is not None:
+        # Users with at least one order since the given time (UTC, like created_at)
+        conditions.append('''EXISTS (
+            SELECT 1 FROM orders
+            WHERE orders.user_id = users.user_id AND orders.created_at >= ?
+        )''')
+        params.append(active_since.strftime('%Y-%m-%d %H:%M:%S'))
+    return ' AND '.join(conditions) or '1', params
+
 
 class Database:
     '''Database manager for SQLite operations'''
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_readers: int = 4,
+                 user_cache_size: int = 10000, user_cache_ttl: float = 600,
+                 pragmas: Optional[Dict[str, Any]] = None, checkpoint_interval: float = 300):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, readers=pool_readers, pragmas=pragmas,
+                                   checkpoint_interval=checkpoint_interval)
+        self._connect_lock = asyncio.Lock()
+        self._closed = False
+        # Profile rows keyed by user_id; kept in sync by the user write methods
+        self.user_cache = TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)
+        self._user_writes = 0
 
-    async def init_db(self):
-        '''Initialize database tables'''
-        async with aiosqlite.connect(self.db_path) as db:
-            # Users table - stores user registration data
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    first_name TEXT NOT NULL,
-                    last_name TEXT NOT NULL,
-                    email TEXT NOT NULL,
-                    phone TEXT NOT NULL,
-                    language TEXT DEFAULT 'uz',
-                    promo_used INTEGER DEFAULT 0,
-                    is_admin INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Cart table - stores shopping cart items
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS cart (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    quantity INTEGER DEFAULT 1,
-                    image TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            ''')
-
-            # Orders table - stores completed orders
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    total_amount REAL NOT NULL,
-                    discount_amount REAL DEFAULT 0,
-                    final_amount REAL NOT NULL,
-                    payment_method TEXT NOT NULL,
-                    latitude REAL,
-                    longitude REAL,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            ''')
-
-            # Order items table - stores individual items in each order
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS order_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    FOREIGN KEY (order_id) REFERENCES orders(id)
-                )
-            ''')
-
-            await db.commit()
+    # ============ CONNECTION POOL ============
+
+    async def connect(self):
+        '''Open the shared connection pool (safe to call more than once before close())'''
+        async with self._connect_lock:
+            if self._closed:
+                raise RuntimeError("Database has been closed")
+            await self.pool.open()
+
+    async def close(self):
+        '''Close the shared connection pool; later reads and writes raise RuntimeError'''
+        self._closed = True
+        await self.pool.close()
+
+    def _check_open(self):
+        # Never reopen implicitly: a pool opened after shutdown keeps the
+        # process alive through aiosqlite's non-daemon threads
+        if not self.pool.is_open:
+            if self._closed:
+                raise RuntimeError("Database has been closed")
+            raise RuntimeError("Database is not connected; call connect() first")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        '''Borrow a pooled read connection'''
+        self._check_open()
+        async with self.pool.reader() as db:
+            yield db
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        '''Borrow the pooled write connection; the block is committed on exit'''
+        self._check_open()
+        async with self.pool.writer() as db:
+            yield db
+
+    def pool_stats(self) -> Dict[str, Any]:
+        '''Connection pool contention counters'''
+        return self.pool.stats()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        '''User profile cache hit/miss counters'''
+        return self.user_cache.stats()
+
+    async def init_db(self) -> List[int]:
+        '''Create or upgrade the schema; returns the migration versions applied'''
+        async with self.writer() as db:
+            # One transaction: a failed migration leaves the previous schema intact
+            await db.execute('BEGIN IMMEDIATE')
+            return await apply_migrations(db)
 
     # ============ USER OPERATIONS ============
 
@@ -79,24 +132,48 @@ class Database:
                        email: str, phone: str, language: str = 'uz') -> bool:
         '''Register a new user'''
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute('''
                     INSERT INTO users (user_id, first_name, last_name, email, phone, language)
                     VALUES (?, ?, ?, ?, ?, ?)
                 ''', (user_id, first_name, last_name, email, phone, language))
-                await db.commit()
-                return True
+            return True
         except Exception as e:
             print(f"Error adding user: {e}")
             return False
+        finally:
+            self._invalidate_user(user_id)
+
+    def _invalidate_user(self, user_id: int):
+        '''Drop a cached profile so the next read goes to the database'''
+        self._user_writes += 1
+        self.user_cache.pop(user_id)
+
+    def _update_cached_user(self, user_id: int, **fields):
+        '''Apply a committed change to the cached profile, if there is one'''
+        self._user_writes += 1
+        user = self.user_cache.get(user_id, count=False)
+        if isinstance(user, dict):
+            user.update(fields)
 
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
-        '''Get user by ID'''
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)) as cursor:
+        '''Get user by ID (served from the profile cache when possible)'''
+        cached = self.user_cache.get(user_id, None)
+        if cached is _NO_USER:
+            return None
+        if cached is not None:
+            return dict(cached)
+
+        writes_before = self._user_writes
+        async with self.reader() as db:
+            async with db.execute(GET_USER_SQL, (user_id,)) as cursor:
                 row = await cursor.fetchone()
-                return dict(row) if row else None
+
+        user = dict(row) if row else None
+        # Skip caching if a user write raced with this read
+        if writes_before == self._user_writes:
+            self.user_cache.set(user_id, dict(user) if user else _NO_USER)
+        return user
 
     async def user_exists(self, user_id: int) -> bool:
         '''Check if user is registered'''
@@ -106,13 +183,14 @@ class Database:
     async def update_user_language(self, user_id: int, language: str) -> bool:
         '''Update user's language preference'''
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute('UPDATE users SET language = ? WHERE user_id = ?',
                                 (language, user_id))
-                await db.commit()
-                return True
         except:
+            self._invalidate_user(user_id)
             return False
+        self._update_cached_user(user_id, language=language)
+        return True
 
     async def get_user_language(self, user_id: int) -> str:
         '''Get user's language preference'''
@@ -122,54 +200,116 @@ class Database:
     async def mark_promo_used(self, user_id: int) -> bool:
         '''Mark promo code as used for user'''
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute('UPDATE users SET promo_used = 1 WHERE user_id = ?',
                                 (user_id,))
-                await db.commit()
-                return True
         except:
+            self._invalidate_user(user_id)
             return False
+        self._update_cached_user(user_id, promo_used=1)
+        return True
 
     async def has_used_promo(self, user_id: int) -> bool:
         '''Check if user has used promo code'''
         user = await self.get_user(user_id)
         return user['promo_used'] == 1 if user else False
 
-    async def get_all_users(self) -> List[int]:
-        '''Get all user IDs for broadcasting'''
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('SELECT user_id FROM users') as cursor:
-                rows = await cursor.fetchall()
-                return [row[0] for row in rows]
+    async def iter_users(self, language: Optional[str] = None, exclude_blocked: bool = False,
+                         active_since: Optional[datetime] = None, after_user_id: int = 0,
+                         fields: Sequence[str] = ('user_id',),
+                         page_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        '''Stream users in user_id order with constant memory
+
+        Pages are fetched by keyset (``user_id > last seen``), so each page
+        is an index range scan and the read connection is returned to the
+        pool between pages. Yields dicts with the requested ``fields``.
+        '''
+        unknown = set(fields) - USER_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown user fields: {sorted(unknown)}")
+        columns = ', '.join(dict.fromkeys(['user_id', *fields]))
+        where, params = user_filter(language, exclude_blocked, active_since)
+        query = USERS_PAGE_SQL.format(columns=columns, where=where)
+
+        last_user_id = after_user_id
+        while True:
+            async with self.reader() as db:
+                async with db.execute(query, (last_user_id, *params, page_size)) as cursor:
+                    rows = await cursor.fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < page_size:
+                return
+            last_user_id = rows[-1]['user_id']
+
+    async def count_users(self, language: Optional[str] = None, exclude_blocked: bool = False,
+                          active_since: Optional[datetime] = None) -> int:
+        '''Number of users iter_users() yields for the same filters'''
+        where, params = user_filter(language, exclude_blocked, active_since)
+        async with self.reader() as db:
+            async with db.execute(f'SELECT COUNT(*) FROM users WHERE {where}', params) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else 0
+
+    async def set_users_blocked(self, user_ids: List[int], blocked: bool = True) -> bool:
+        '''Mark users who blocked (or unblocked) the bot'''
+        try:
+            async with self.writer() as db:
+                await db.executemany('UPDATE users SET is_blocked = ? WHERE user_id = ?',
+                                     [(int(blocked), user_id) for user_id in user_ids])
+        except Exception as e:
+            print(f"Error updating blocked users: {e}")
+            for user_id in user_ids:
+                self._invalidate_user(user_id)
+            return False
+        for user_id in user_ids:
+            self._update_cached_user(user_id, is_blocked=int(blocked))
+        return True
+
+    # ============ BROADCAST OPERATIONS ============
+
+    async def create_broadcast_job(self, admin_id: int, lang: str, from_chat_id: int,
+                                   message_id: int, progress_message_id: Optional[int],
+                                   total: int) -> Dict[str, Any]:
+        '''Record a new broadcast and return its row'''
+        async with self.writer() as db:
+            cursor = await db.execute('''
+                INSERT INTO broadcast_jobs (admin_id, lang, from_chat_id, message_id,
+                                            progress_message_id, total)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (admin_id, lang, from_chat_id, message_id, progress_message_id, total))
+            async with db.execute('SELECT * FROM broadcast_jobs WHERE id = ?',
+                                  (cursor.lastrowid,)) as cursor:
+                return dict(await cursor.fetchone())
+
+    async def get_running_broadcast_jobs(self) -> List[Dict[str, Any]]:
+        '''Broadcasts interrupted by a shutdown, oldest first'''
+        async with self.reader() as db:
+            async with db.execute('''
+                SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id
+            ''') as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def save_broadcast_progress(self, job_id: int, last_user_id: int, sent: int,
+                                      failed: int, blocked: int, status: str = 'running'):
+        '''Persist a broadcast's counters and resume point'''
+        async with self.writer() as db:
+            await db.execute('''
+                UPDATE broadcast_jobs
+                SET last_user_id = ?, sent = ?, failed = ?, blocked = ?, status = ?,
+                    finished_at = CASE WHEN ? = 'running' THEN NULL ELSE CURRENT_TIMESTAMP END
+                WHERE id = ?
+            ''', (last_user_id, sent, failed, blocked, status, status, job_id))
 
     # ============ CART OPERATIONS ============
 
     async def add_to_cart(self, user_id: int, product_id: int, title: str,
-                          price: float, image: str = None) -> bool:
-        '''Add product to cart or increase quantity'''
+                          price: float, image: str = None, quantity: int = 1) -> bool:
+        '''Add product to cart or increase its quantity, in a single statement'''
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Check if product already in cart
-                async with db.execute('''
-                    SELECT quantity FROM cart
-                    WHERE user_id = ? AND product_id = ?
-                ''', (user_id, product_id)) as cursor:
-                    row = await cursor.fetchone()
-
-                if row:
-                    # Increase quantity if already exists
-                    await db.execute('''
-                        UPDATE cart SET quantity = quantity + 1
-                        WHERE user_id = ? AND product_id = ?
-                    ''', (user_id, product_id))
-                else:
-                    # Add new item to cart
-                    await db.execute('''
-                        INSERT INTO cart (user_id, product_id, title, price, image)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (user_id, product_id, title, price, image))
-
-                await db.commit()
+            async with self.writer() as db:
+                await db.execute(ADD_TO_CART_SQL,
+                                 (user_id, product_id, title, price, quantity, image))
                 return True
         except Exception as e:
             print(f"Error adding to cart: {e}")
@@ -177,22 +317,16 @@ class Database:
 
     async def get_cart(self, user_id: int) -> List[Dict[str, Any]]:
         '''Get user's cart items'''
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute('''
-                SELECT * FROM cart WHERE user_id = ?
-            ''', (user_id,)) as cursor:
+        async with self.reader() as db:
+            async with db.execute(GET_CART_SQL, (user_id,)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
     async def remove_from_cart(self, user_id: int, product_id: int) -> bool:
         '''Remove product from cart'''
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
-                    DELETE FROM cart WHERE user_id = ? AND product_id = ?
-                ''', (user_id, product_id))
-                await db.commit()
+            async with self.writer() as db:
+                await db.execute(REMOVE_FROM_CART_SQL, (user_id, product_id))
                 return True
         except:
             return False
@@ -200,68 +334,109 @@ class Database:
     async def clear_cart(self, user_id: int) -> bool:
         '''Clear all items from user's cart'''
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
-                await db.commit()
+            async with self.writer() as db:
+                await db.execute(CLEAR_CART_SQL, (user_id,))
                 return True
         except:
             return False
 
     async def get_cart_total(self, user_id: int) -> float:
         '''Calculate total cart value'''
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('''
-                SELECT SUM(price * quantity) as total FROM cart WHERE user_id = ?
-            ''', (user_id,)) as cursor:
+        async with self.reader() as db:
+            async with db.execute(CART_TOTAL_SQL, (user_id,)) as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row[0] else 0.0
 
     # ============ ORDER OPERATIONS ============
 
-    async def create_order(self, user_id: int, total_amount: float,
-                          discount_amount: float, final_amount: float,
-                          payment_method: str, latitude: float = None,
-                          longitude: float = None) -> Optional[int]:
-        '''Create a new order and return order ID'''
+    async def get_order_by_key(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        '''Get the order created for a checkout session, if any'''
+        async with self.reader() as db:
+            async with db.execute(ORDER_BY_KEY_SQL,
+                                  (idempotency_key,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def create_order(self, user_id: int, payment_method: str, idempotency_key: str,
+                          promo_discount: float = 0, latitude: float = None,
+                          longitude: float = None) -> Optional[Dict[str, Any]]:
+        '''Turn the user's cart into an order in a single transaction
+
+        Totals are computed from the cart in SQL, the items are copied with one
+        INSERT ... SELECT and the cart is cleared before committing. A
+        ``promo_discount`` is only applied if the user's promo can still be
+        consumed, and it is marked used in the same transaction.
+
+        Repeated calls with the same ``idempotency_key`` return the order from
+        the first call without writing anything. Returns the order row, or None
+        if the cart was empty or the write failed.
+        '''
+        promo_consumed = False
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
+                await db.execute('BEGIN IMMEDIATE')
+                async with db.execute(ORDER_BY_KEY_SQL,
+                                      (idempotency_key,)) as cursor:
+                    existing = await cursor.fetchone()
+                if existing:
+                    return dict(existing)
+
+                discount_percent = 0
+                if promo_discount:
+                    cursor = await db.execute('''
+                        UPDATE users SET promo_used = 1 WHERE user_id = ? AND promo_used = 0
+                    ''', (user_id,))
+                    promo_consumed = cursor.rowcount == 1
+                    if promo_consumed:
+                        discount_percent = promo_discount
+
                 cursor = await db.execute('''
-                    INSERT INTO orders (user_id, total_amount, discount_amount,
-                                      final_amount, payment_method, latitude, longitude)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (user_id, total_amount, discount_amount, final_amount,
-                     payment_method, latitude, longitude))
+                    INSERT INTO orders (user_id, total_amount, discount_amount, final_amount,
+                                      payment_method, latitude, longitude, idempotency_key)
+                    SELECT ?, total, total * ? / 100.0, total - total * ? / 100.0, ?, ?, ?, ?
+                    FROM (SELECT SUM(price * quantity) AS total FROM cart WHERE user_id = ?)
+                    WHERE total IS NOT NULL
+                ''', (user_id, discount_percent, discount_percent, payment_method,
+                     latitude, longitude, idempotency_key, user_id))
+                if cursor.rowcount == 0:
+                    # Empty cart: raise so the promo update is rolled back
+                    raise LookupError('cart is empty')
 
                 order_id = cursor.lastrowid
 
-                # Add cart items to order_items
-                cart_items = await self.get_cart(user_id)
-                for item in cart_items:
-                    await db.execute('''
-                        INSERT INTO order_items (order_id, product_id, title, price, quantity)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (order_id, item['product_id'], item['title'],
-                         item['price'], item['quantity']))
-
-                await db.commit()
-                return order_id
+                # Move cart items to order_items and empty the cart
+                await db.execute('''
+                    INSERT INTO order_items (order_id, product_id, title, price, quantity)
+                    SELECT ?, product_id, title, price, quantity FROM cart
+                    WHERE user_id = ? ORDER BY id
+                ''', (order_id, user_id))
+                await db.execute(CLEAR_CART_SQL, (user_id,))
+
+                async with db.execute('SELECT * FROM orders WHERE id = ?', (order_id,)) as cursor:
+                    order = dict(await cursor.fetchone())
+        except LookupError:
+            return None
+        except sqlite3.IntegrityError:
+            # Another process committed the same checkout first
+            return await self.get_order_by_key(idempotency_key)
         except Exception as e:
             print(f"Error creating order: {e}")
             return None
 
+        if promo_consumed:
+            self._update_cached_user(user_id, promo_used=1)
+        return order
+
     async def get_user_orders(self, user_id: int) -> List[Dict[str, Any]]:
         '''Get all orders for a user'''
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute('''
-                SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC
-            ''', (user_id,)) as cursor:
+        async with self.reader() as db:
+            async with db.execute(USER_ORDERS_SQL, (user_id,)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
     async def get_total_orders_count(self) -> int:
         '''Get total number of orders (for admin)'''
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.reader() as db:
             async with db.execute('SELECT COUNT(*) FROM orders') as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else 0
\ No newline at end of file
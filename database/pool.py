@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    '''Long-lived SQLite connections: a single writer plus N readers
+
+    ``pragmas`` are applied to every connection as it is opened (in order, so
+    ``journal_mode`` should come first). In WAL mode a background task runs a
+    passive checkpoint every ``checkpoint_interval`` seconds so the WAL file
+    does not grow without bound between SQLite's automatic checkpoints.
+    '''
+
+    def __init__(self, db_path: str, readers: int = 4, pragmas: Optional[Dict[str, Any]] = None,
+                 checkpoint_interval: float = 300):
+        self.db_path = db_path
+        self.reader_count = max(1, readers)
+        self.pragmas = dict(pragmas or {})
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self.checkpoints = 0
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._stats = {
+            'reader': self._empty_stats(),
+            'writer': self._empty_stats()
+        }
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, float]:
+        return {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'hold_time': 0.0,
+            'max_hold_time': 0.0
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        '''Open a single connection with the pool-wide settings'''
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for name, value in self.pragmas.items():
+            await conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @property
+    def wal_enabled(self) -> bool:
+        return str(self.pragmas.get('journal_mode', '')).upper() == 'WAL'
+
+    async def checkpoint(self, mode: str = 'PASSIVE'):
+        '''Copy committed WAL frames back into the database file'''
+        async with self._writer_lock:
+            await self._writer.execute(f'PRAGMA wal_checkpoint({mode})')
+        self.checkpoints += 1
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.warning("WAL checkpoint failed: %s", e)
+
+    async def open(self):
+        '''Open the writer and all reader connections'''
+        if self.is_open:
+            return
+
+        self._idle = asyncio.Queue()
+        self._writer = await self._connect()
+        for _ in range(self.reader_count):
+            conn = await self._connect()
+            self._readers.append(conn)
+            self._idle.put_nowait(conn)
+
+        if self.wal_enabled and self.checkpoint_interval > 0:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    async def close(self):
+        '''Close every connection owned by the pool'''
+        if not self.is_open:
+            return
+
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+        if self.wal_enabled:
+            # Fold the WAL back into the main file so it is left small on disk
+            try:
+                await self.checkpoint('TRUNCATE')
+            except Exception as e:
+                logger.warning("Final WAL checkpoint failed: %s", e)
+
+        async with self._writer_lock:
+            for conn in self._readers:
+                await conn.close()
+            self._readers.clear()
+            await self._writer.close()
+            self._writer = None
+            self._idle = None
+
+    def _record(self, role: str, waited: bool, wait_time: float, hold_time: float):
+        stats = self._stats[role]
+        stats['checkouts'] += 1
+        if waited:
+            stats['waits'] += 1
+        stats['wait_time'] += wait_time
+        stats['hold_time'] += hold_time
+        stats['max_hold_time'] = max(stats['max_hold_time'], hold_time)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        '''Borrow a read-only connection from the pool'''
+        waited = self._idle.empty()
+        started = time.perf_counter()
+        conn = await self._idle.get()
+        acquired = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+            self._record('reader', waited, acquired - started,
+                         time.perf_counter() - acquired)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        '''Hold the writer connection; commits on success, rolls back on error'''
+        waited = self._writer_lock.locked()
+        started = time.perf_counter()
+        async with self._writer_lock:
+            acquired = time.perf_counter()
+            conn = self._writer
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+            finally:
+                self._record('writer', waited, acquired - started,
+                             time.perf_counter() - acquired)
+
+    def stats(self) -> Dict[str, Any]:
+        '''Checkout, wait and hold-time counters per connection role'''
+        result = {}
+        for role, stats in self._stats.items():
+            checkouts = stats['checkouts'] or 1
+            result[role] = dict(
+                stats,
+                avg_wait_time=stats['wait_time'] / checkouts,
+                avg_hold_time=stats['hold_time'] / checkouts
+            )
+        result['readers'] = self.reader_count
+        result['checkpoints'] = self.checkpoints
+        result['idle_readers'] = self._idle.qsize() if self._idle else 0
+        return result
@@ -19,6 +19,8 @@ async def main():
     except Exception as e:
         print(f"Status: Failed")
         print(f"Error: {e}")
+    finally:
+        await service.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,45 @@
+import asyncio
+import json
+import sys
+import time
+import aiohttp
+from config import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+# Used when no recorded update file is given: a private /start message
+SAMPLE_UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': 1, 'type': 'private', 'first_name': 'Test'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Test', 'language_code': 'en'},
+        'text': '/start',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+    }
+}
+
+async def main():
+    '''POST a recorded update (JSON file, one update or a list) to a local webhook server
+
+    Usage: python debug_webhook.py [update.json] [url]
+    Start the bot with BOT_MODE=webhook and the same WEBHOOK_SECRET first.
+    '''
+    updates = SAMPLE_UPDATE
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            updates = json.load(f)
+    if isinstance(updates, dict):
+        updates = [updates]
+    url = sys.argv[2] if len(sys.argv) > 2 else f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    headers = {'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET}
+
+    async with aiohttp.ClientSession() as session:
+        for update in updates:
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                body = await response.text()
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"update {update.get('update_id')}: {response.status} {body} ({elapsed:.1f}ms)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
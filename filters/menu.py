@@ -0,0 +1,17 @@
+from typing import Optional
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+
+class MenuAction(Filter):
+    '''Match reply-keyboard buttons of the given actions, in any language
+
+    Compares the ``menu_action`` resolved by MenuTextMiddleware, so no
+    button texts are scanned per handler.
+    '''
+
+    def __init__(self, *actions: str):
+        self.actions = frozenset(actions)
+
+    async def __call__(self, message: Message, menu_action: Optional[str] = None) -> bool:
+        return menu_action in self.actions
@@ -3,29 +3,21 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from database.models import Database
+from services.broadcast import BroadcastEngine
 from keyboards.inline import get_admin_keyboard
 from keyboards.reply import get_main_menu_keyboard
+from filters.menu import MenuAction
 from utils.translations import get_text
 from states.user_states import BroadcastStates
-from config import DATABASE_PATH, ADMIN_IDS
 
 router = Router()
-db = Database(DATABASE_PATH)
 
-def is_admin(user_id: int) -> bool:
-    '''Check if user is admin'''
-    return user_id in ADMIN_IDS
-
-@router.message(F.text.in_([get_text('admin_panel', 'uz'), get_text('admin_panel', 'ru'), get_text('admin_panel', 'en')]))
-async def admin_panel(message: Message):
+@router.message(MenuAction('admin_panel'))
+async def admin_panel(message: Message, lang: str, is_admin: bool):
     '''Show admin panel'''
-    user_id = message.from_user.id
-
-    if not is_admin(user_id):
+    if not is_admin:
         return
 
-    lang = await db.get_user_language(user_id)
-
     await message.answer(
         f"👨‍💼 <b>{get_text('admin_panel', lang)}</b>",
         reply_markup=get_admin_keyboard(lang),
@@ -33,16 +25,12 @@ async def admin_panel(message: Message):
     )
 
 @router.callback_query(F.data == 'admin_orders')
-async def show_total_orders(callback: CallbackQuery):
+async def show_total_orders(callback: CallbackQuery, db: Database, lang: str, is_admin: bool):
     '''Show total orders statistics'''
-    user_id = callback.from_user.id
-
-    if not is_admin(user_id):
+    if not is_admin:
         await callback.answer("❌ Access denied", show_alert=True)
         return
 
-    lang = await db.get_user_language(user_id)
-
     # Get total orders count
     total_orders = await db.get_total_orders_count()
 
@@ -57,45 +45,37 @@ async def show_total_orders(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == 'admin_broadcast')
-async def start_broadcast(callback: CallbackQuery, state: FSMContext):
+async def start_broadcast(callback: CallbackQuery, state: FSMContext, lang: str, is_admin: bool):
     '''Start broadcast message flow'''
-    user_id = callback.from_user.id
-
-    if not is_admin(user_id):
+    if not is_admin:
         await callback.answer("❌ Access denied", show_alert=True)
         return
 
-    lang = await db.get_user_language(user_id)
-
     await callback.message.answer(get_text('enter_broadcast', lang))
     await state.set_state(BroadcastStates.waiting_for_message)
     await callback.answer()
 
 @router.message(BroadcastStates.waiting_for_message)
-async def process_broadcast(message: Message, state: FSMContext):
+async def process_broadcast(message: Message, state: FSMContext, broadcaster: BroadcastEngine,
+                            lang: str, is_admin: bool):
     '''Send broadcast message to all users'''
-    user_id = message.from_user.id
-
-    if not is_admin(user_id):
+    if not is_admin:
         return
 
-    lang = await db.get_user_language(user_id)
-
-    # Get all users
-    all_users = await db.get_all_users()
-
-    # Send message to all users
-    success_count = 0
-    for target_user_id in all_users:
-        try:
-            await message.copy_to(target_user_id)
-            success_count += 1
-        except:
-            pass  # User blocked the bot or other error
-
-    # Send confirmation
     await message.answer(
-        get_text('broadcast_success', lang, count=success_count),
+        get_text('broadcast_started', lang),
         reply_markup=get_main_menu_keyboard(lang, is_admin=True)
     )
-    await state.clear()
\ No newline at end of file
+    await state.clear()
+
+    # Sending runs in the background; this message is edited with the progress
+    progress = await message.answer(
+        get_text('broadcast_progress', lang, done=0, total='…', sent=0, blocked=0, failed=0)
+    )
+    await broadcaster.submit(
+        admin_id=message.from_user.id,
+        lang=lang,
+        from_chat_id=message.chat.id,
+        message_id=message.message_id,
+        progress_message_id=progress.message_id
+    )
\ No newline at end of file
@@ -1,42 +1,59 @@
+import time
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from database.models import Database
 from services.api_service import DummyJSONService
+from services.models import Product
+from services.session_store import ProductStore
 from keyboards.inline import get_cart_keyboard
+from filters.menu import MenuAction
 from utils.translations import get_text
-from config import DATABASE_PATH
+from config import PRODUCT_FRESHNESS_SECONDS
 
 router = Router()
-db = Database(DATABASE_PATH)
-api = DummyJSONService()
+
+async def resolve_product(product_id: int, api: DummyJSONService,
+                          products_store: ProductStore) -> Optional[Product]:
+    '''Find product details without a network call when local data is fresh enough
+
+    Uses the newest copy from the shared product store (pages users have
+    browsed or searched, and the catalog mirror). Only if there is none, or
+    it is older than PRODUCT_FRESHNESS_SECONDS, is it fetched from the API;
+    a stale local copy is still used if that fetch fails.
+    '''
+    product, loaded_at = products_store.get(product_id)
+    if product and time.time() - loaded_at <= PRODUCT_FRESHNESS_SECONDS:
+        return product
+
+    fetched = await api.get_product_by_id(product_id, use_cache=False)
+    if fetched:
+        products_store.put([fetched], time.time())
+        return fetched
+    return product
 
 @router.callback_query(F.data.startswith('add_to_cart_'))
-async def add_to_cart(callback: CallbackQuery):
+async def add_to_cart(callback: CallbackQuery, db: Database, api: DummyJSONService,
+                      products_store: ProductStore, lang: str):
     '''Add product to shopping cart'''
     user_id = callback.from_user.id
-    lang = await db.get_user_language(user_id)
 
     product_id = int(callback.data.replace('add_to_cart_', ''))
 
-    # Fetch product details from API
-    product = await api.get_product_by_id(product_id)
+    # Product details from the page already shown, verified upstream only if stale
+    product = await resolve_product(product_id, api, products_store)
 
     if not product:
         await callback.answer("❌ Product not found", show_alert=True)
         return
 
-    # Calculate final price with discount
-    price = product.get('price', 0)
-    discount = product.get('discountPercentage', 0)
-    final_price = price - (price * discount / 100)
-
-    # Add to cart in database
+    # Add to cart in database at the discounted price
     success = await db.add_to_cart(
         user_id=user_id,
         product_id=product_id,
-        title=product.get('title', 'Product'),
-        price=final_price,
-        image=product.get('thumbnail')
+        title=product.title or 'Product',
+        price=product.final_price,
+        image=product.image or None
     )
 
     if success:
@@ -44,11 +61,10 @@ async def add_to_cart(callback: CallbackQuery):
     else:
         await callback.answer("❌ Failed to add to cart", show_alert=True)
 
-@router.message(F.text.in_([get_text('cart', 'uz'), get_text('cart', 'ru'), get_text('cart', 'en')]))
-async def show_cart(message: Message):
+@router.message(MenuAction('cart'))
+async def show_cart(message: Message, db: Database, lang: str):
     '''Display shopping cart'''
     user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
 
     # Get cart items
     cart_items = await db.get_cart(user_id)
@@ -80,10 +96,9 @@ async def show_cart(message: Message):
     )
 
 @router.callback_query(F.data.startswith('remove_from_cart_'))
-async def remove_from_cart(callback: CallbackQuery):
+async def remove_from_cart(callback: CallbackQuery, db: Database, lang: str):
     '''Remove product from cart'''
     user_id = callback.from_user.id
-    lang = await db.get_user_language(user_id)
 
     product_id = int(callback.data.replace('remove_from_cart_', ''))
 
@@ -122,10 +137,9 @@ async def remove_from_cart(callback: CallbackQuery):
         await callback.answer("❌ Failed to remove", show_alert=True)
 
 @router.callback_query(F.data == 'clear_cart')
-async def clear_cart(callback: CallbackQuery):
+async def clear_cart(callback: CallbackQuery, db: Database, lang: str):
     '''Clear entire shopping cart'''
     user_id = callback.from_user.id
-    lang = await db.get_user_language(user_id)
 
     await db.clear_cart(user_id)
 
@@ -1,30 +1,24 @@
+import time
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InputMediaPhoto
-from database.models import Database
 from services.api_service import DummyJSONService
+from services.catalog_mirror import CatalogMirror
+from services.session_store import ProductStore, SessionStore
 from keyboards.inline import get_categories_keyboard, get_product_keyboard
+from filters.menu import MenuAction
 from utils.translations import get_text
-from config import DATABASE_PATH
 
 router = Router()
-db = Database(DATABASE_PATH)
-api = DummyJSONService()
 
-# Store current browsing state per user
-user_browse_state = {}
-
-@router.message(F.text.in_([get_text('catalog', 'uz'), get_text('catalog', 'ru'), get_text('catalog', 'en')]))
-async def show_catalog(message: Message):
+@router.message(MenuAction('catalog'))
+async def show_catalog(message: Message, api: DummyJSONService, mirror: CatalogMirror, lang: str):
     '''Show product catalog with categories'''
-    user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
-
-    loading_msg = await message.answer(get_text('loading', lang))
-
-    # Fetch categories from API
-    categories = await api.get_categories()
-
-    await loading_msg.delete()
+    # Categories come from the local mirror; the API is only asked on a miss
+    categories = mirror.get_categories()
+    if not categories:
+        loading_msg = await message.answer(get_text('loading', lang))
+        categories = await api.get_categories()
+        await loading_msg.delete()
 
     await message.answer(
         get_text('categories', lang),
@@ -32,65 +26,75 @@ async def show_catalog(message: Message):
     )
 
 @router.callback_query(F.data.startswith('category_'))
-async def show_category_products(callback: CallbackQuery):
+async def show_category_products(callback: CallbackQuery, api: DummyJSONService,
+                                 mirror: CatalogMirror, products_store: ProductStore,
+                                 sessions: SessionStore, lang: str):
     '''Show products from selected category'''
     user_id = callback.from_user.id
-    lang = await db.get_user_language(user_id)
 
     category = callback.data.replace('category_', '')
 
-    await callback.message.edit_text(get_text('loading', lang))
-
-    # Fetch products
+    # Read products from the mirror, fetching from the API only on a miss
     if category == 'all':
-        result = await api.get_products(limit=30)
-        products = result.get('products', [])
+        products = mirror.get_products(limit=30)
     else:
-        products = await api.get_products_by_category(category, limit=30)
+        products = mirror.get_products_by_category(category, limit=30)
+    loaded_at = mirror.synced_at
+
+    if not products:
+        loaded_at = time.time()
+        await callback.message.edit_text(get_text('loading', lang))
+        if category == 'all':
+            result = await api.get_products(limit=30)
+            products = result.get('products', [])
+        else:
+            products = await api.get_products_by_category(category, limit=30)
 
     if not products:
         await callback.message.edit_text(get_text('no_results', lang))
         await callback.answer()
         return
 
-    # Store products in user state for pagination
-    user_browse_state[user_id] = {
-        'products': products,
-        'current_page': 0
-    }
+    # Keep only product ids for pagination; the products go to the shared store
+    sessions.start(('browse', user_id), products_store.put(products, loaded_at))
 
     # Show first product
-    await show_product_page(callback.message, user_id, 0, edit=True)
+    await show_product_page(callback.message, user_id, 0, lang, api, products_store, sessions, edit=True)
     await callback.answer()
 
-async def show_product_page(message: Message, user_id: int, page: int, edit: bool = False):
+async def show_product_page(message: Message, user_id: int, page: int, lang: str,
+                            api: DummyJSONService, products_store: ProductStore,
+                            sessions: SessionStore, edit: bool = False):
     '''Display a single product page'''
-    lang = await db.get_user_language(user_id)
-
-    if user_id not in user_browse_state:
+    session = sessions.get(('browse', user_id))
+    if session is None:
         return
 
-    products = user_browse_state[user_id]['products']
-
-    if page < 0 or page >= len(products):
+    if page < 0 or page >= len(session):
         return
 
-    product = products[page]
-    user_browse_state[user_id]['current_page'] = page
+    product_id = session.product_ids[page]
+    product, _ = products_store.get(product_id)
+    if product is None:
+        # Evicted from the shared store: fall back to the (cached) API
+        product = await api.get_product_by_id(product_id)
+        if product is None:
+            return
+    session.current_page = page
 
     # Format product information
     text = api.format_product_text(product, lang)
 
     # Get product image
-    image_url = product.get('thumbnail') or product.get('images', [''])[0]
+    image_url = product.image
 
     # Create keyboard
     keyboard = get_product_keyboard(
-        product_id=product['id'],
+        product_id=product.id,
         lang=lang,
         show_pagination=True,
         current_page=page,
-        total_pages=len(products)
+        total_pages=len(session)
     )
 
     try:
@@ -122,25 +126,25 @@ async def show_product_page(message: Message, user_id: int, page: int, edit: boo
         await message.answer(text, reply_markup=keyboard, parse_mode='HTML')
 
 @router.callback_query(F.data.startswith('page_'))
-async def navigate_products(callback: CallbackQuery):
+async def navigate_products(callback: CallbackQuery, api: DummyJSONService,
+                            products_store: ProductStore, sessions: SessionStore, lang: str):
     '''Handle product pagination'''
     user_id = callback.from_user.id
     page = int(callback.data.replace('page_', ''))
 
-    await show_product_page(callback.message, user_id, page, edit=True)
+    await show_product_page(callback.message, user_id, page, lang, api, products_store, sessions, edit=True)
     await callback.answer()
 
 @router.callback_query(F.data == 'back_to_categories')
-async def back_to_categories(callback: CallbackQuery):
+async def back_to_categories(callback: CallbackQuery, api: DummyJSONService,
+                             mirror: CatalogMirror, sessions: SessionStore, lang: str):
     '''Return to categories menu'''
     user_id = callback.from_user.id
-    lang = await db.get_user_language(user_id)
 
     # Clear user browse state
-    if user_id in user_browse_state:
-        del user_browse_state[user_id]
+    sessions.pop(('browse', user_id))
 
-    categories = await api.get_categories()
+    categories = mirror.get_categories() or await api.get_categories()
 
     await callback.message.delete()
     await callback.message.answer(
@@ -1,3 +1,6 @@
+import hashlib
+import uuid
+from typing import Any, Dict, List, Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
@@ -5,16 +8,19 @@ from database.models import Database
 from keyboards.reply import get_location_keyboard, get_payment_keyboard, get_promo_keyboard, get_main_menu_keyboard
 from utils.translations import get_text
 from states.user_states import CheckoutStates
-from config import DATABASE_PATH, PROMO_CODE, PROMO_DISCOUNT, ADMIN_IDS
+from config import PROMO_CODE, PROMO_DISCOUNT
 
 router = Router()
-db = Database(DATABASE_PATH)
+
+def checkout_key(user_id: int, checkout_id: str, cart_items: List[Dict[str, Any]]) -> str:
+    '''Idempotency key for one checkout session and the cart it started with'''
+    snapshot = sorted((item['product_id'], item['quantity'], item['price']) for item in cart_items)
+    return hashlib.sha256(f"{user_id}:{checkout_id}:{snapshot}".encode()).hexdigest()
 
 @router.callback_query(F.data == 'checkout')
-async def start_checkout(callback: CallbackQuery, state: FSMContext):
+async def start_checkout(callback: CallbackQuery, state: FSMContext, db: Database, lang: str):
     '''Start checkout process'''
     user_id = callback.from_user.id
-    lang = await db.get_user_language(user_id)
 
     # Check if cart is empty
     cart_items = await db.get_cart(user_id)
@@ -22,9 +28,10 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
         await callback.answer(get_text('cart_empty', lang), show_alert=True)
         return
 
-    # Calculate total
-    total = await db.get_cart_total(user_id)
-    await state.update_data(total_amount=total)
+    # Every submission of this checkout session maps to the same order
+    await state.update_data(
+        idempotency_key=checkout_key(user_id, uuid.uuid4().hex, cart_items)
+    )
 
     # Ask for promo code
     await callback.message.answer(
@@ -35,44 +42,33 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(CheckoutStates.waiting_for_promo)
-async def process_promo(message: Message, state: FSMContext):
+async def process_promo(message: Message, state: FSMContext,
+                        lang: str, user_profile: Optional[dict]):
     '''Process promo code input'''
-    user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
-
-    data = await state.get_data()
-    total_amount = data.get('total_amount', 0)
-    discount_amount = 0
+    discount_percent = 0
 
     promo_text = message.text.strip().upper()
 
     # Check if user skipped promo
     if message.text == get_text('skip', lang):
-        final_amount = total_amount
+        pass
     elif promo_text == PROMO_CODE:
         # Check if user already used promo
-        has_used = await db.has_used_promo(user_id)
+        has_used = bool(user_profile and user_profile['promo_used'])
         if has_used:
             await message.answer(get_text('promo_used', lang))
-            final_amount = total_amount
         else:
-            # Apply promo discount
-            discount_amount = total_amount * (PROMO_DISCOUNT / 100)
-            final_amount = total_amount - discount_amount
+            # The promo is consumed together with the order in create_order
+            discount_percent = PROMO_DISCOUNT
             await message.answer(
                 get_text('promo_applied', lang, percent=PROMO_DISCOUNT)
             )
-            await db.mark_promo_used(user_id)
     else:
         # Invalid promo code
         await message.answer(get_text('promo_invalid', lang))
-        final_amount = total_amount
 
-    # Save amounts to state
-    await state.update_data(
-        discount_amount=discount_amount,
-        final_amount=final_amount
-    )
+    # Save discount to state
+    await state.update_data(discount_percent=discount_percent)
 
     # Ask for location
     await message.answer(
@@ -82,11 +78,8 @@ async def process_promo(message: Message, state: FSMContext):
     await state.set_state(CheckoutStates.waiting_for_location)
 
 @router.message(CheckoutStates.waiting_for_location, F.location)
-async def process_location(message: Message, state: FSMContext):
+async def process_location(message: Message, state: FSMContext, lang: str):
     '''Process delivery location'''
-    user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
-
     latitude = message.location.latitude
     longitude = message.location.longitude
 
@@ -103,10 +96,9 @@ async def process_location(message: Message, state: FSMContext):
     await state.set_state(CheckoutStates.waiting_for_payment)
 
 @router.message(CheckoutStates.waiting_for_payment)
-async def process_payment(message: Message, state: FSMContext):
+async def process_payment(message: Message, state: FSMContext, db: Database, lang: str, is_admin: bool):
     '''Process payment method and complete order'''
     user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
 
     payment_text = message.text
 
@@ -117,34 +109,28 @@ async def process_payment(message: Message, state: FSMContext):
 
     # Get all checkout data
     data = await state.get_data()
-    total_amount = data.get('total_amount', 0)
-    discount_amount = data.get('discount_amount', 0)
-    final_amount = data.get('final_amount', 0)
+    discount_percent = data.get('discount_percent', 0)
     latitude = data.get('latitude')
     longitude = data.get('longitude')
 
     payment_method = 'cash' if payment_text == get_text('cash', lang) else 'card'
 
-    # Create order in database
-    order_id = await db.create_order(
+    # Create the order, its items and clear the cart in one transaction;
+    # a repeated submission gets the existing order back
+    order = await db.create_order(
         user_id=user_id,
-        total_amount=total_amount,
-        discount_amount=discount_amount,
-        final_amount=final_amount,
         payment_method=payment_method,
+        idempotency_key=data.get('idempotency_key') or uuid.uuid4().hex,
+        promo_discount=discount_percent,
         latitude=latitude,
         longitude=longitude
     )
 
-    if order_id:
-        # Clear cart after successful order
-        await db.clear_cart(user_id)
-
+    if order:
         # Send confirmation
-        is_admin = user_id in ADMIN_IDS
         success_text = get_text('order_success', lang)
-        success_text += f"\n\n{get_text('order_number', lang)}: #{order_id}"
-        success_text += f"\n💵 {get_text('total', lang)}: ${final_amount:.2f}"
+        success_text += f"\n\n{get_text('order_number', lang)}: #{order['id']}"
+        success_text += f"\n💵 {get_text('total', lang)}: ${order['final_amount']:.2f}"
 
         await message.answer(
             success_text,
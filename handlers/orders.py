@@ -1,17 +1,15 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message
 from database.models import Database
+from filters.menu import MenuAction
 from utils.translations import get_text
-from config import DATABASE_PATH
 
 router = Router()
-db = Database(DATABASE_PATH)
 
-@router.message(F.text.in_([get_text('my_orders', 'uz'), get_text('my_orders', 'ru'), get_text('my_orders', 'en')]))
-async def show_my_orders(message: Message):
+@router.message(MenuAction('my_orders'))
+async def show_my_orders(message: Message, db: Database, lang: str):
     '''Show user's order history'''
     user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
 
     # Get user orders
     orders = await db.get_user_orders(user_id)
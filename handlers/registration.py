@@ -5,11 +5,9 @@ from database.models import Database
 from keyboards.reply import get_contact_keyboard, get_main_menu_keyboard
 from utils.translations import get_text
 from states.user_states import RegistrationStates
-from config import DATABASE_PATH, ADMIN_IDS
 import re
 
 router = Router()
-db = Database(DATABASE_PATH)
 
 # Email validation regex
 EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
@@ -55,7 +53,7 @@ async def process_email(message: Message, state: FSMContext):
     await state.set_state(RegistrationStates.waiting_for_phone)
 
 @router.message(RegistrationStates.waiting_for_phone, F.contact)
-async def process_phone(message: Message, state: FSMContext):
+async def process_phone(message: Message, state: FSMContext, db: Database, is_admin: bool):
     '''Process phone number via contact sharing'''
     phone = message.contact.phone_number
     user_id = message.from_user.id
@@ -78,7 +76,6 @@ async def process_phone(message: Message, state: FSMContext):
     )
 
     if success:
-        is_admin = user_id in ADMIN_IDS
         await message.answer(
             get_text('registration_complete', lang),
             reply_markup=get_main_menu_keyboard(lang, is_admin)
@@ -1,46 +1,46 @@
+import time
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
-from database.models import Database
 from services.api_service import DummyJSONService
+from services.catalog_mirror import CatalogMirror
+from services.search_index import SearchIndex
+from services.session_store import ProductStore, SessionStore
 from keyboards.inline import get_product_keyboard
 from keyboards.reply import get_main_menu_keyboard
+from filters.menu import MenuAction
 from utils.translations import get_text
 from states.user_states import SearchStates
-from config import DATABASE_PATH, ADMIN_IDS
 
 router = Router()
-db = Database(DATABASE_PATH)
-api = DummyJSONService()
 
-# Store search results per user
-user_search_results = {}
-
-@router.message(F.text.in_([get_text('search', 'uz'), get_text('search', 'ru'), get_text('search', 'en')]))
-async def start_search(message: Message, state: FSMContext):
+@router.message(MenuAction('search'))
+async def start_search(message: Message, state: FSMContext, lang: str):
     '''Start product search flow'''
-    user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
-
     await message.answer(get_text('enter_search', lang))
     await state.set_state(SearchStates.waiting_for_query)
 
 @router.message(SearchStates.waiting_for_query)
-async def process_search(message: Message, state: FSMContext):
+async def process_search(message: Message, state: FSMContext, api: DummyJSONService,
+                         mirror: CatalogMirror, search_index: SearchIndex,
+                         products_store: ProductStore, sessions: SessionStore,
+                         lang: str, is_admin: bool):
     '''Process search query and show results'''
     user_id = message.from_user.id
-    lang = await db.get_user_language(user_id)
     query = message.text.strip()
 
-    loading_msg = await message.answer(get_text('loading', lang))
-
-    # Search products via API
-    products = await api.search_products(query)
-
-    await loading_msg.delete()
+    if search_index.ready:
+        # Ranked search over the local catalog index
+        products = search_index.search(query)
+        loaded_at = mirror.synced_at
+    else:
+        # Search products via API until the catalog has been indexed
+        loading_msg = await message.answer(get_text('loading', lang))
+        products = await api.search_products(query)
+        loaded_at = time.time()
+        await loading_msg.delete()
 
     if not products:
-        is_admin = user_id in ADMIN_IDS
         await message.answer(
             get_text('no_results', lang),
             reply_markup=get_main_menu_keyboard(lang, is_admin)
@@ -48,45 +48,47 @@ async def process_search(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    # Store search results
-    user_search_results[user_id] = {
-        'products': products,
-        'current_page': 0
-    }
+    # Store result ids; the products go to the shared store
+    sessions.start(('search', user_id), products_store.put(products, loaded_at))
 
     # Show first result
-    await show_search_result(message, user_id, 0)
+    await show_search_result(message, user_id, 0, lang, api, products_store, sessions)
     await state.clear()
 
-async def show_search_result(message: Message, user_id: int, page: int, edit: bool = False):
+async def show_search_result(message: Message, user_id: int, page: int, lang: str,
+                             api: DummyJSONService, products_store: ProductStore,
+                             sessions: SessionStore, edit: bool = False):
     '''Display a single search result'''
-    lang = await db.get_user_language(user_id)
-
-    if user_id not in user_search_results:
+    session = sessions.get(('search', user_id))
+    if session is None:
         return
 
-    products = user_search_results[user_id]['products']
-
-    if page < 0 or page >= len(products):
+    if page < 0 or page >= len(session):
         return
 
-    product = products[page]
-    user_search_results[user_id]['current_page'] = page
+    product_id = session.product_ids[page]
+    product, _ = products_store.get(product_id)
+    if product is None:
+        # Evicted from the shared store: fall back to the (cached) API
+        product = await api.get_product_by_id(product_id)
+        if product is None:
+            return
+    session.current_page = page
 
     # Format product information
     text = f"🔍 <b>{get_text('search_results', lang)}</b>\n\n"
     text += api.format_product_text(product, lang)
 
     # Get product image
-    image_url = product.get('thumbnail') or product.get('images', [''])[0]
+    image_url = product.image
 
     # Create keyboard
     keyboard = get_product_keyboard(
-        product_id=product['id'],
+        product_id=product.id,
         lang=lang,
         show_pagination=True,
         current_page=page,
-        total_pages=len(products)
+        total_pages=len(session)
     )
 
     try:
@@ -115,10 +117,11 @@ async def show_search_result(message: Message, user_id: int, page: int, edit: bo
         await message.answer(text, reply_markup=keyboard, parse_mode='HTML')
 
 @router.callback_query(F.data.startswith('search_page_'))
-async def navigate_search_results(callback: CallbackQuery):
+async def navigate_search_results(callback: CallbackQuery, api: DummyJSONService,
+                                  products_store: ProductStore, sessions: SessionStore, lang: str):
     '''Navigate through search results'''
     user_id = callback.from_user.id
     page = int(callback.data.replace('search_page_', ''))
 
-    await show_search_result(callback.message, user_id, page, edit=True)
+    await show_search_result(callback.message, user_id, page, lang, api, products_store, sessions, edit=True)
     await callback.answer()
\ No newline at end of file
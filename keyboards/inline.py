@@ -1,10 +1,23 @@
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from config import KEYBOARD_CACHE_SIZE
 from utils.translations import get_text
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+
+# Markups are immutable, so one cached instance can be sent to every user.
+# Keyboards that embed a product or cart item cache everything but that part.
 
 def get_categories_keyboard(categories: List[Dict[str, Any]], lang: str = 'uz') -> InlineKeyboardMarkup:
-    '''Create inline keyboard for categories'''
+    '''Create inline keyboard for categories (cached per language and category list)'''
+    entries = tuple(
+        (str(category.get('slug', '')), str(category.get('name', 'Category')))
+        for category in categories if isinstance(category, dict)
+    )
+    return _categories_keyboard(entries, lang)
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _categories_keyboard(entries: Tuple[Tuple[str, str], ...], lang: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
     # Add "All Products" button
@@ -14,13 +27,7 @@ def get_categories_keyboard(categories: List[Dict[str, Any]], lang: str = 'uz')
     )
 
     # Add category buttons
-    for category in categories:
-        if not isinstance(category, dict):
-            continue
-            
-        name = str(category.get('name', 'Category'))
-        slug = str(category.get('slug', ''))
-        
+    for slug, name in entries:
         if not slug:
             continue
             
@@ -42,76 +49,80 @@ def get_product_keyboard(product_id: int, lang: str = 'uz',
                          current_page: int = 0,
                          total_pages: int = 0) -> InlineKeyboardMarkup:
     '''Create inline keyboard for product card'''
-    builder = InlineKeyboardBuilder()
-
-    # Add to cart button
-    builder.button(
-        text=get_text('add_to_cart', lang),
-        callback_data=f'add_to_cart_{product_id}'
-    )
+    if not (show_pagination and total_pages > 1):
+        current_page = total_pages = 0
+    add_text, rows = _product_keyboard_rows(lang, current_page, total_pages)
+    add_button = InlineKeyboardButton(text=add_text, callback_data=f'add_to_cart_{product_id}')
+    return InlineKeyboardMarkup(inline_keyboard=[[add_button], *rows])
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _product_keyboard_rows(lang: str, current_page: int,
+                           total_pages: int) -> Tuple[str, Tuple[List[InlineKeyboardButton], ...]]:
+    '''Add-to-cart label plus every row below that button (one button per row)'''
+    rows = []
 
     # Pagination buttons if needed
-    if show_pagination and total_pages > 1:
-        buttons_row = []
-
+    if total_pages > 1:
         if current_page > 0:
-            buttons_row.append(InlineKeyboardButton(
+            rows.append([InlineKeyboardButton(
                 text=get_text('previous', lang),
                 callback_data=f'page_{current_page - 1}'
-            ))
+            )])
 
-        buttons_row.append(InlineKeyboardButton(
+        rows.append([InlineKeyboardButton(
             text=f'{current_page + 1}/{total_pages}',
             callback_data='current_page'
-        ))
+        )])
 
         if current_page < total_pages - 1:
-            buttons_row.append(InlineKeyboardButton(
+            rows.append([InlineKeyboardButton(
                 text=get_text('next', lang),
                 callback_data=f'page_{current_page + 1}'
-            ))
-
-        builder.row(*buttons_row)
+            )])
 
     # Back button
-    builder.button(
+    rows.append([InlineKeyboardButton(
         text=get_text('back', lang),
         callback_data='back_to_categories'
-    )
+    )])
 
-    builder.adjust(1)
-    return builder.as_markup()
+    return get_text('add_to_cart', lang), tuple(rows)
 
 def get_cart_keyboard(cart_items: List[Dict[str, Any]], lang: str = 'uz') -> InlineKeyboardMarkup:
     '''Create inline keyboard for cart'''
-    builder = InlineKeyboardBuilder()
-
-    if cart_items:
-        # Remove buttons for each item
-        for item in cart_items:
-            builder.button(
-                text=f"🗑 {item['title']} (x{item['quantity']})",
-                callback_data=f"remove_from_cart_{item['product_id']}"
-            )
-
-        # Clear cart and checkout buttons
-        builder.button(
-            text=get_text('clear_cart', lang),
-            callback_data='clear_cart'
-        )
-        builder.button(
-            text=get_text('checkout', lang),
-            callback_data='checkout'
-        )
+    if not cart_items:
+        return _empty_cart_keyboard(lang)
+
+    # Remove buttons for each item
+    rows = [
+        [InlineKeyboardButton(
+            text=f"🗑 {item['title']} (x{item['quantity']})",
+            callback_data=f"remove_from_cart_{item['product_id']}"
+        )]
+        for item in cart_items
+    ]
+    rows.extend(_cart_keyboard_rows(lang))
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _cart_keyboard_rows(lang: str) -> Tuple[List[InlineKeyboardButton], ...]:
+    '''Clear cart, checkout and back rows shown under the items'''
+    return (
+        [InlineKeyboardButton(text=get_text('clear_cart', lang), callback_data='clear_cart')],
+        [InlineKeyboardButton(text=get_text('checkout', lang), callback_data='checkout')],
+        [InlineKeyboardButton(text=get_text('back', lang), callback_data='back_to_menu')]
+    )
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _empty_cart_keyboard(lang: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
     builder.button(
         text=get_text('back', lang),
         callback_data='back_to_menu'
     )
-
-    builder.adjust(1)
     return builder.as_markup()
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_admin_keyboard(lang: str = 'uz') -> InlineKeyboardMarkup:
     '''Create admin panel keyboard'''
     builder = InlineKeyboardBuilder()
@@ -130,4 +141,19 @@ def get_admin_keyboard(lang: str = 'uz') -> InlineKeyboardMarkup:
     )
 
     builder.adjust(1)
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+def clear_categories_cache():
+    '''Drop cached category keyboards (called when the catalog is re-synced)'''
+    _categories_keyboard.cache_clear()
+
+def keyboard_cache_stats() -> Dict[str, Any]:
+    '''Hit/miss counters of the inline keyboard caches'''
+    caches = {
+        'categories': _categories_keyboard,
+        'product': _product_keyboard_rows,
+        'cart': _cart_keyboard_rows,
+        'empty_cart': _empty_cart_keyboard,
+        'admin': get_admin_keyboard
+    }
+    return {name: cache.cache_info()._asdict() for name, cache in caches.items()}
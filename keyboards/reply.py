@@ -1,8 +1,13 @@
+from functools import lru_cache
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 from utils.translations import get_text
-from config import LANGUAGES
+from config import KEYBOARD_CACHE_SIZE, LANGUAGES
 
+# Every keyboard here depends only on its arguments; markups are immutable,
+# so one cached instance per language is shared by all users
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_language_keyboard() -> ReplyKeyboardMarkup:
     '''Create language selection keyboard'''
     builder = ReplyKeyboardBuilder()
@@ -11,6 +16,7 @@ def get_language_keyboard() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_contact_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     '''Create contact sharing keyboard'''
     builder = ReplyKeyboardBuilder()
@@ -21,6 +27,7 @@ def get_contact_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_main_menu_keyboard(lang: str = 'uz', is_admin: bool = False) -> ReplyKeyboardMarkup:
     '''Create main menu keyboard'''
     builder = ReplyKeyboardBuilder()
@@ -37,6 +44,7 @@ def get_main_menu_keyboard(lang: str = 'uz', is_admin: bool = False) -> ReplyKey
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_location_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     '''Create location sharing keyboard'''
     builder = ReplyKeyboardBuilder()
@@ -48,6 +56,7 @@ def get_location_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_payment_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     '''Create payment method selection keyboard'''
     builder = ReplyKeyboardBuilder()
@@ -57,6 +66,7 @@ def get_payment_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_promo_keyboard(lang: str = 'uz') -> ReplyKeyboardMarkup:
     '''Create promo code keyboard with skip option'''
     builder = ReplyKeyboardBuilder()
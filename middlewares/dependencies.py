@@ -0,0 +1,19 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class DependencyMiddleware(BaseMiddleware):
+    '''Inject shared service objects (database, API client, caches) into handlers'''
+
+    def __init__(self, **dependencies: Any):
+        self.dependencies = dependencies
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        data.update(self.dependencies)
+        return await handler(event, data)
@@ -0,0 +1,23 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from utils.translations import menu_action
+
+
+class MenuTextMiddleware(BaseMiddleware):
+    '''Look up a message's text in the menu index once, before any router filter runs
+
+    Handlers and filters receive ``menu_action`` (e.g. ``'catalog'``, or
+    ``'language'`` for a language button) and ``menu_lang``, the language
+    of the button that was pressed; both are None for other texts.
+    Registered on ``dp.message`` so it runs once per message for all routers.
+    '''
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        data['menu_action'], data['menu_lang'] = menu_action(event.text) or (None, None)
+        return await handler(event, data)
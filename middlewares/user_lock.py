@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update, User
+
+
+class _UserQueue:
+    '''Lock and waiting updates of one user'''
+    __slots__ = ('lock', 'depth', 'latest')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0  # Updates holding or waiting for the lock
+        self.latest: Dict[str, int] = {}  # Newest ticket per coalesced callback prefix
+
+
+class UserLockMiddleware(BaseMiddleware):
+    '''Handle one update at a time per user while different users run concurrently
+
+    A user's updates wait on that user's lock, which is FIFO, so they run
+    in arrival order; the lock is dropped as soon as the user has nothing
+    in flight. A callback whose data starts with one of ``coalesce`` is
+    skipped (answered without running its handler) when a newer callback
+    with the same prefix from the same user is already waiting, so a burst
+    of page taps renders only the last page.
+
+    Must be registered before the FSM middleware, so the state a handler
+    sees is loaded inside the lock.
+    '''
+
+    def __init__(self, coalesce: Tuple[str, ...] = ()):
+        # Longest first: 'search_page_' must not be taken for a shorter prefix
+        self.coalesce = tuple(sorted(coalesce, key=len, reverse=True))
+        self._queues: Dict[int, _UserQueue] = {}
+        self._tickets = 0
+        self._stats = {'updates': 0, 'waits': 0, 'wait_time': 0.0, 'max_wait_time': 0.0,
+                       'max_depth': 0, 'coalesced': 0}
+
+    def _coalesce_prefix(self, event: TelegramObject) -> Optional[str]:
+        callback = event.callback_query if isinstance(event, Update) else None
+        if callback is None or not callback.data:
+            return None
+        for prefix in self.coalesce:
+            if callback.data.startswith(prefix):
+                return prefix
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        queue = self._queues.get(user.id)
+        if queue is None:
+            queue = self._queues[user.id] = _UserQueue()
+        queue.depth += 1
+        self._stats['updates'] += 1
+        self._stats['max_depth'] = max(self._stats['max_depth'], queue.depth)
+
+        prefix = self._coalesce_prefix(event)
+        if prefix:
+            self._tickets += 1
+            ticket = queue.latest[prefix] = self._tickets
+
+        contended = queue.lock.locked()
+        started = time.monotonic()
+        try:
+            async with queue.lock:
+                if contended:
+                    waited = time.monotonic() - started
+                    self._stats['waits'] += 1
+                    self._stats['wait_time'] += waited
+                    self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+
+                if prefix and queue.latest[prefix] != ticket:
+                    self._stats['coalesced'] += 1
+                    try:
+                        # Stop the button's loading indicator
+                        await event.callback_query.answer()
+                    except TelegramAPIError:
+                        pass
+                    return None
+                return await handler(event, data)
+        finally:
+            queue.depth -= 1
+            if queue.depth == 0:
+                del self._queues[user.id]
+
+    def stats(self) -> Dict[str, Any]:
+        '''Contention counters; ``users`` is the number of locks currently held'''
+        stats = dict(self._stats)
+        stats['users'] = len(self._queues)
+        stats['avg_wait_time'] = stats['wait_time'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from config import ADMIN_IDS
+
+
+class UserProfileMiddleware(BaseMiddleware):
+    '''Resolve the sender's profile once per update and inject it into handlers
+
+    Handlers receive ``user_profile`` (users row or None), ``lang``,
+    ``is_admin`` and ``is_registered``. Must run after DependencyMiddleware,
+    which provides ``db``.
+    '''
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User = data.get('event_from_user')
+        profile = await data['db'].get_user(user.id) if user else None
+        if profile and profile.get('is_blocked') and (
+                getattr(event, 'message', None) or getattr(event, 'callback_query', None)):
+            # The user is talking to the bot again, so broadcasts reach them
+            await data['db'].set_users_blocked([user.id], blocked=False)
+            profile['is_blocked'] = 0
+
+        data['user_profile'] = profile
+        data['is_registered'] = profile is not None
+        data['lang'] = profile['language'] if profile else 'uz'
+        data['is_admin'] = user is not None and user.id in ADMIN_IDS
+        return await handler(event, data)
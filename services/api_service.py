@@ -1,95 +1,252 @@
+import asyncio
+import logging
+import time
 import aiohttp
-from typing import List, Dict, Any, Optional
-from config import DUMMYJSON_API_URL
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Hashable, Set
+from config import (DUMMYJSON_API_URL, API_TIMEOUT, API_CONNECT_TIMEOUT, API_CONNECTION_LIMIT,
+                    API_CONNECTION_LIMIT_PER_HOST, API_KEEPALIVE_TIMEOUT, API_DNS_CACHE_TTL,
+                    API_CACHE_SIZE, API_CACHE_TTL, API_CACHE_STALE_TTL, API_JSON_DECODER)
+from services.json_decoding import JSONDecoder
+from services.models import Product
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    '''API response cache with TTL, stale-while-revalidate and request coalescing
+
+    Fresh entries are returned directly. Entries past their TTL but within the
+    stale window are returned immediately while one background refresh runs.
+    Concurrent misses for the same key share a single upstream call. ``None``
+    results (failed requests) are never stored.
+    '''
+
+    def __init__(self, maxsize: int = 512, stale_ttl: float = 600):
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'refreshes': 0,
+            'errors': 0
+        }
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        '''Return the cached value for key, calling fetch() only when needed'''
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < ttl:
+                self._stats['hits'] += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < ttl + self.stale_ttl:
+                self._stats['stale_hits'] += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self._stats['refreshes'] += 1
+                    task = asyncio.create_task(self._refresh(key, fetch))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                return value
+
+        self._stats['misses'] += 1
+        return await self._load(key, fetch)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        '''Run fetch() once per key no matter how many callers are waiting'''
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats['coalesced'] += 1
+        else:
+            future = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled waiter must not cancel the call other waiters share
+        return await asyncio.shield(future)
+
+    async def _fetch_and_store(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+        if value is not None:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        try:
+            await self._load(key, fetch)
+        except Exception as e:
+            logger.warning("Background refresh of %s failed: %s", key, e)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        '''Drop one entry, or the whole cache when no key is given'''
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def close(self):
+        '''Cancel background refreshes'''
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        '''Hit, stale-hit, miss, coalesced-call and refresh counters'''
+        lookups = self._stats['hits'] + self._stats['stale_hits'] + self._stats['misses']
+        return dict(
+            self._stats,
+            size=len(self._entries),
+            inflight=len(self._inflight),
+            hit_rate=(self._stats['hits'] + self._stats['stale_hits']) / lookups if lookups else 0.0
+        )
 
 class DummyJSONService:
     '''Service for interacting with DummyJSON API'''
 
-    def __init__(self):
-        self.base_url = "https://dummyjson.com"
+    def __init__(self, decoder: Optional[JSONDecoder] = None):
+        self.base_url = DUMMYJSON_API_URL
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.cache = ResponseCache(maxsize=API_CACHE_SIZE, stale_ttl=API_CACHE_STALE_TTL)
+        self.decoder = decoder or JSONDecoder(API_JSON_DECODER)
 
-    async def get_categories(self) -> List[Dict[str, Any]]:
+    # ============ SESSION LIFECYCLE ============
+
+    async def start(self):
+        '''Open the shared HTTP session (safe to call more than once)'''
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=API_CONNECTION_LIMIT,
+            limit_per_host=API_CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=API_DNS_CACHE_TTL,
+            use_dns_cache=True
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=API_TIMEOUT, connect=API_CONNECT_TIMEOUT)
+        )
+
+    async def close(self):
+        '''Close the shared HTTP session and its pooled connections'''
+        await self.cache.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_json(self, path: str, params: Optional[Dict[str, Any]] = None,
+                        decode: Optional[Callable[[bytes], Any]] = None) -> Any:
+        '''GET an endpoint on the shared session; None on non-200 responses
+
+        The body is decoded with ``decode`` (the decoder's generic ``loads``
+        by default), so product endpoints can use a schema-directed decoder.
+        '''
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        async with self._session.get(f'{self.base_url}{path}', params=params) as response:
+            if response.status == 200:
+                return (decode or self.decoder.loads)(await response.read())
+            return None
+
+    async def _cached_get_json(self, kind: str, path: str,
+                               params: Optional[Dict[str, Any]] = None,
+                               use_cache: bool = True,
+                               decode: Optional[Callable[[bytes], Any]] = None) -> Any:
+        '''Like _get_json, but served through the response cache with the TTL for kind'''
+        if not use_cache:
+            return await self._get_json(path, params, decode)
+        key = (path, tuple(sorted(params.items())) if params else ())
+        return await self.cache.get(key, lambda: self._get_json(path, params, decode),
+                                    API_CACHE_TTL[kind])
+
+    def cache_stats(self) -> Dict[str, Any]:
+        '''Response cache counters'''
+        return self.cache.stats()
+
+    # ============ ENDPOINTS ============
+
+    async def get_categories(self, use_cache: bool = True) -> List[Dict[str, Any]]:
         '''Fetch all product categories'''
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'{self.base_url}/products/categories') as response:
-                    if response.status == 200:
-                        categories = await response.json()
-                        return categories
-            return []
+            categories = await self._cached_get_json('categories', '/products/categories',
+                                                     use_cache=use_cache)
+            return categories if categories is not None else []
         except Exception as e:
             print(f"Error fetching categories: {e}")
             return []
 
-    async def get_products(self, limit: int = 10, skip: int = 0) -> Dict[str, Any]:
-        '''Fetch products with pagination'''
+    async def get_products(self, limit: int = 10, skip: int = 0, select: Optional[str] = None,
+                           use_cache: bool = True) -> Dict[str, Any]:
+        '''Fetch products with pagination (optionally only the select-ed fields)'''
+        params = {'limit': limit, 'skip': skip}
+        if select:
+            params['select'] = select
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f'{self.base_url}/products?limit={limit}&skip={skip}'
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data
-            return {'products': [], 'total': 0}
+            data = await self._cached_get_json('products', '/products', params, use_cache=use_cache,
+                                              decode=self.decoder.product_list)
+            if data is not None:
+                return data
         except Exception as e:
             print(f"Error fetching products: {e}")
-            return {'products': [], 'total': 0}
+        return {'products': [], 'total': 0}
 
-    async def get_products_by_category(self, category: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_products_by_category(self, category: str, limit: int = 10) -> List[Product]:
         '''Fetch products by category'''
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f'{self.base_url}/products/category/{category}?limit={limit}'
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get('products', [])
-            return []
+            data = await self._cached_get_json('products', f'/products/category/{category}',
+                                              {'limit': limit}, decode=self.decoder.product_list)
+            return data.get('products', []) if data is not None else []
         except Exception as e:
             print(f"Error fetching category products: {e}")
             return []
 
-    async def get_product_by_id(self, product_id: int) -> Optional[Dict[str, Any]]:
+    async def get_product_by_id(self, product_id: int, use_cache: bool = True) -> Optional[Product]:
         '''Fetch single product by ID'''
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'{self.base_url}/products/{product_id}') as response:
-                    if response.status == 200:
-                        product = await response.json()
-                        return product
-            return None
+            return await self._cached_get_json('product', f'/products/{product_id}',
+                                               use_cache=use_cache, decode=self.decoder.product)
         except Exception as e:
             print(f"Error fetching product: {e}")
             return None
 
-    async def search_products(self, query: str) -> List[Dict[str, Any]]:
+    async def search_products(self, query: str) -> List[Product]:
         '''Search products by query'''
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f'{self.base_url}/products/search?q={query}'
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get('products', [])
-            return []
+            data = await self._cached_get_json('search', '/products/search', {'q': query},
+                                              decode=self.decoder.product_list)
+            return data.get('products', []) if data is not None else []
         except Exception as e:
             print(f"Error searching products: {e}")
             return []
 
     @staticmethod
-    def format_product_text(product: Dict[str, Any], lang: str = 'uz') -> str:
+    def format_product_text(product: Product, lang: str = 'uz') -> str:
         '''Format product information for display'''
-        title = product.get('title', 'N/A')
-        description = product.get('description', 'No description')
-        price = product.get('price', 0)
-        discount = product.get('discountPercentage', 0)
-        rating = product.get('rating', 0)
-
-        # Calculate final price after discount
-        final_price = price - (price * discount / 100)
+        title = product.title or 'N/A'
+        description = product.description or 'No description'
+        # Fields are floats; print whole numbers without ".0" like the API does
+        price = Product.format_number(product.price)
+        discount = Product.format_number(product.discount_percentage)
+        rating = Product.format_number(product.rating)
+        final_price = product.final_price
 
         # Format rating with stars
-        stars = '⭐' * int(rating)
+        stars = '⭐' * int(product.rating)
 
         # Translate labels based on language
         labels = {
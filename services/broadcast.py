@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set
+from aiogram import Bot
+from aiogram.exceptions import (TelegramAPIError, TelegramBadRequest, TelegramForbiddenError,
+                                TelegramRetryAfter)
+from database.models import Database
+from utils.translations import get_text
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    '''Token bucket for the global send rate plus a minimum gap per chat
+
+    ``pause(seconds)`` stops every sender, which is how a flood-control
+    RetryAfter from Telegram is honoured.
+    '''
+
+    def __init__(self, rate: float, per_chat_interval: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.per_chat_interval = per_chat_interval
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_next: Dict[int, float] = {}
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def wait(self, chat_id: int):
+        '''Block until a message may be sent to chat_id'''
+        # The per-chat gap is waited out without holding up other chats
+        delay = self._chat_next.get(chat_id, 0.0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+        self._chat_next[chat_id] = now + self.per_chat_interval
+        if len(self._chat_next) > 10000:
+            # Forget chats whose gap has already passed
+            self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+
+
+class BroadcastJob:
+    '''Counters and resume point of one running broadcast'''
+
+    def __init__(self, row: Dict[str, Any]):
+        self.id: int = row['id']
+        self.admin_id: int = row['admin_id']
+        self.lang: str = row['lang']
+        self.from_chat_id: int = row['from_chat_id']
+        self.message_id: int = row['message_id']
+        self.progress_message_id: Optional[int] = row['progress_message_id']
+        self.total: int = row['total']
+        self.last_user_id: int = row['last_user_id']
+        self.sent: int = row['sent']
+        self.failed: int = row['failed']
+        self.blocked: int = row['blocked']
+        # Recipients handed to workers but not finished yet
+        self.in_flight: Set[int] = set()
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.blocked
+
+    def resume_point(self, last_queued: int) -> int:
+        '''Highest user_id below which every recipient has been handled'''
+        return min(self.in_flight) - 1 if self.in_flight else last_queued
+
+
+class BroadcastEngine:
+    '''Sends broadcasts in the background with a bounded pool of workers
+
+    Recipients are paged from the database in user_id order and sent with
+    ``copy_message`` through a shared RateLimiter. Users who blocked the bot
+    are marked so later broadcasts skip them. Every ``progress_interval``
+    seconds the job's counters and resume point are saved and the admin's
+    progress message is edited; jobs still running at shutdown are resumed
+    by ``start()`` (a few recipients in flight at the time may get the
+    message twice).
+
+    In cluster mode only one process sends: the others create jobs with
+    ``run_jobs=False`` and the sender picks them up every ``watch_interval``
+    seconds, so the global rate limit holds across processes.
+    '''
+
+    def __init__(self, bot: Bot, db: Database, workers: int = 8, rate: float = 25,
+                 per_chat_interval: float = 1.0, max_retries: int = 3,
+                 progress_interval: float = 5, page_size: int = 500, run_jobs: bool = True,
+                 watch_interval: Optional[float] = None):
+        self.bot = bot
+        self.db = db
+        self.workers = workers
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.page_size = page_size
+        self.run_jobs = run_jobs
+        self.watch_interval = watch_interval
+        self.limiter = RateLimiter(rate, per_chat_interval)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Jobs this process has run; a finished job is never picked up again
+        self._launched: Set[int] = set()
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        '''Resume broadcasts interrupted by the last shutdown'''
+        if not self.run_jobs:
+            return
+        await self._pick_up()
+        if self.watch_interval and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _pick_up(self):
+        '''Launch running jobs from the database that this process has not run yet'''
+        for row in await self.db.get_running_broadcast_jobs():
+            if row['id'] not in self._launched:
+                logger.info("Running broadcast %s after user %s", row['id'], row['last_user_id'])
+                self._launch(BroadcastJob(row))
+
+    async def _watch(self):
+        '''Pick up jobs submitted by other processes'''
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                await self._pick_up()
+            except Exception as e:
+                logger.warning("Checking for new broadcasts failed: %s", e)
+
+    async def close(self):
+        '''Stop running broadcasts; their progress is saved for the next start()'''
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, admin_id: int, lang: str, from_chat_id: int, message_id: int,
+                     progress_message_id: Optional[int] = None) -> int:
+        '''Start broadcasting a message to every user; returns the job id'''
+        total = await self.db.count_users(exclude_blocked=True)
+        row = await self.db.create_broadcast_job(admin_id, lang, from_chat_id, message_id,
+                                                 progress_message_id, total)
+        if self.run_jobs:
+            self._launch(BroadcastJob(row))
+        return row['id']
+
+    def _launch(self, job: BroadcastJob):
+        self._launched.add(job.id)
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+
+    # ============ JOB ============
+
+    async def _run(self, job: BroadcastJob):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        blocked: List[int] = []
+        last_queued = job.last_user_id
+        workers = [asyncio.create_task(self._worker(job, queue, blocked)) for _ in range(self.workers)]
+        reporter = asyncio.create_task(self._report_loop(job, blocked, lambda: last_queued))
+        status = 'running'
+        try:
+            async for user in self.db.iter_users(exclude_blocked=True, after_user_id=last_queued,
+                                                 page_size=self.page_size):
+                user_id = user['user_id']
+                job.in_flight.add(user_id)
+                await queue.put(user_id)
+                last_queued = user_id
+            await queue.join()
+            status = 'done'
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.exception("Broadcast %s failed: %s", job.id, e)
+            status = 'failed'
+        finally:
+            reporter.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+            await self._save(job, blocked, job.resume_point(last_queued), status)
+
+        if status != 'running':
+            await self._notify(job, get_text('broadcast_done', job.lang, sent=job.sent,
+                                             blocked=job.blocked, failed=job.failed))
+
+    async def _worker(self, job: BroadcastJob, queue: asyncio.Queue, blocked: List[int]):
+        while True:
+            user_id = await queue.get()
+            try:
+                await self._send(job, user_id, blocked)
+            except Exception as e:
+                logger.warning("Broadcast %s: sending to %s failed: %s", job.id, user_id, e)
+                job.failed += 1
+            # Not reached when cancelled, so the recipient stays in the resume range
+            job.in_flight.discard(user_id)
+            queue.task_done()
+
+    async def _send(self, job: BroadcastJob, user_id: int, blocked: List[int]):
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.wait(user_id)
+            try:
+                await self.bot.copy_message(chat_id=user_id, from_chat_id=job.from_chat_id,
+                                            message_id=job.message_id)
+                job.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                # Flood control applies to the whole bot: pause every worker
+                logger.warning("Broadcast %s: flood control, retrying in %ss", job.id, e.retry_after)
+                self.limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                blocked.append(user_id)
+                job.blocked += 1
+                return
+            except TelegramAPIError as e:
+                logger.debug("Broadcast %s: sending to %s failed: %s", job.id, user_id, e)
+                job.failed += 1
+                return
+        job.failed += 1
+
+    # ============ PROGRESS ============
+
+    async def _report_loop(self, job: BroadcastJob, blocked: List[int], last_queued):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                await self._save(job, blocked, job.resume_point(last_queued()))
+                await self._notify(job, get_text('broadcast_progress', job.lang, done=job.done,
+                                                 total=job.total, sent=job.sent,
+                                                 blocked=job.blocked, failed=job.failed))
+            except Exception as e:
+                logger.warning("Broadcast %s: progress update failed: %s", job.id, e)
+
+    async def _save(self, job: BroadcastJob, blocked: List[int], resume_point: int,
+                    status: str = 'running'):
+        '''Persist blocked users, counters and the resume point'''
+        if blocked:
+            marked, blocked[:] = list(blocked), []
+            await self.db.set_users_blocked(marked)
+        await self.db.save_broadcast_progress(job.id, resume_point, job.sent, job.failed,
+                                              job.blocked, status)
+
+    async def _notify(self, job: BroadcastJob, text: str):
+        '''Show progress in the admin's progress message (or a new message)'''
+        try:
+            if job.progress_message_id:
+                await self.bot.edit_message_text(text, chat_id=job.admin_id,
+                                                 message_id=job.progress_message_id)
+            else:
+                await self.bot.send_message(job.admin_id, text)
+        except TelegramBadRequest:
+            # Unchanged text ("message is not modified") or the message was deleted
+            pass
+        except TelegramAPIError as e:
+            logger.warning("Broadcast %s: could not notify admin: %s", job.id, e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'running_jobs': len(self._tasks)}
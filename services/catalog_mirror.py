@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+from services.api_service import DummyJSONService
+from services.models import Product
+
+logger = logging.getLogger(__name__)
+
+class CatalogMirror:
+    '''In-memory copy of the whole DummyJSON catalog, kept fresh in the background
+
+    The first sync pages through ``/products`` with ``limit``/``skip``. Later
+    syncs list only ``id`` + ``meta.updatedAt`` for every product and re-fetch
+    just the products that were added or changed, falling back to a full sync
+    when too many changed at once. Readers always see a consistent snapshot:
+    a sync builds new indexes and swaps them in at the end.
+    '''
+
+    def __init__(self, api: DummyJSONService, page_size: int = 100,
+                 sync_interval: float = 900, max_incremental: int = 50):
+        self.api = api
+        self.page_size = page_size
+        self.sync_interval = sync_interval
+        self.max_incremental = max_incremental
+        self._products: Dict[int, Product] = {}
+        self._ids: List[int] = []
+        self._by_category: Dict[str, List[int]] = {}
+        self._categories: List[Dict[str, Any]] = []
+        self._listeners: List[Callable[['CatalogMirror'], Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.synced_at: Optional[float] = None
+        self._stats = {'full_syncs': 0, 'incremental_syncs': 0, 'failed_syncs': 0, 'updated_products': 0}
+
+    @property
+    def ready(self) -> bool:
+        '''True once at least one sync has completed'''
+        return self.synced_at is not None
+
+    # ============ LIFECYCLE ============
+
+    async def start(self):
+        '''Start the background sync loop; the first sync runs immediately'''
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        '''Stop the background sync loop'''
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def add_listener(self, callback: Callable[['CatalogMirror'], Any]):
+        '''Call callback(mirror) after every successful sync'''
+        self._listeners.append(callback)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self._stats['failed_syncs'] += 1
+                logger.warning("Catalog sync failed: %s", e)
+            await asyncio.sleep(self.sync_interval)
+
+    # ============ SYNC ============
+
+    async def sync(self) -> bool:
+        '''Bring the mirror up to date; returns False if the upstream was unavailable'''
+        if not self.ready:
+            synced = await self._full_sync()
+        else:
+            synced = await self._incremental_sync()
+
+        if not synced:
+            self._stats['failed_syncs'] += 1
+            return False
+
+        self.synced_at = time.time()
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.warning("Catalog sync listener failed: %s", e)
+        return True
+
+    async def _full_sync(self) -> bool:
+        products: Dict[int, Product] = {}
+        skip = 0
+        while True:
+            page = await self.api.get_products(limit=self.page_size, skip=skip, use_cache=False)
+            items = page.get('products', [])
+            total = page.get('total', 0)
+            if not items:
+                # An empty first page means the upstream call failed
+                if not total or skip < total:
+                    return False
+                break
+            for product in items:
+                products[product.id] = product
+            skip += len(items)
+            if skip >= total:
+                break
+
+        categories = await self.api.get_categories(use_cache=False)
+        self._swap(products, categories or self._categories)
+        self._stats['full_syncs'] += 1
+        self._stats['updated_products'] += len(products)
+        return True
+
+    async def _incremental_sync(self) -> bool:
+        listing = await self.api.get_products(limit=0, select='meta', use_cache=False)
+        entries = listing.get('products', [])
+        if not entries:
+            return False
+
+        changed = []
+        for entry in entries:
+            current = self._products.get(entry.id)
+            if current is None or current.updated_at != entry.updated_at:
+                changed.append(entry.id)
+
+        if len(changed) > self.max_incremental:
+            return await self._full_sync()
+
+        fetched = await asyncio.gather(
+            *[self.api.get_product_by_id(product_id, use_cache=False) for product_id in changed]
+        )
+        if any(product is None for product in fetched):
+            return False
+
+        live_ids = {entry.id for entry in entries}
+        products = {product_id: product for product_id, product in self._products.items()
+                    if product_id in live_ids}
+        for product in fetched:
+            products[product.id] = product
+
+        categories = self._categories
+        if changed or len(products) != len(self._products):
+            categories = await self.api.get_categories(use_cache=False) or self._categories
+        self._swap(products, categories)
+        self._stats['incremental_syncs'] += 1
+        self._stats['updated_products'] += len(changed)
+        return True
+
+    def _swap(self, products: Dict[int, Product], categories: List[Dict[str, Any]]):
+        '''Replace the snapshot readers see in one step'''
+        ids = sorted(products)
+        by_category: Dict[str, List[int]] = {}
+        for product_id in ids:
+            by_category.setdefault(products[product_id].category, []).append(product_id)
+
+        self._products = products
+        self._ids = ids
+        self._by_category = by_category
+        self._categories = categories
+
+    # ============ READS ============
+
+    def get_categories(self) -> List[Dict[str, Any]]:
+        '''All categories as returned by /products/categories'''
+        return self._categories
+
+    def get_product(self, product_id: int) -> Optional[Product]:
+        '''Single product by ID, or None if it is not mirrored'''
+        return self._products.get(product_id)
+
+    def get_products(self, limit: int = 10, skip: int = 0) -> List[Product]:
+        '''Products in ID order, like /products?limit=&skip='''
+        ids = self._ids[skip:skip + limit]
+        return [self._products[product_id] for product_id in ids]
+
+    def get_products_by_category(self, category: str, limit: int = 10) -> List[Product]:
+        '''Products of one category slug in ID order'''
+        ids = self._by_category.get(category, [])[:limit]
+        return [self._products[product_id] for product_id in ids]
+
+    def all_products(self) -> List[Product]:
+        '''Every mirrored product'''
+        return list(self._products.values())
+
+    def stats(self) -> Dict[str, Any]:
+        '''Sync counters and snapshot size'''
+        return dict(
+            self._stats,
+            products=len(self._products),
+            categories=len(self._categories),
+            synced_at=self.synced_at
+        )
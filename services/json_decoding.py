@@ -0,0 +1,95 @@
+import json
+from typing import Any, Callable, Dict, List, Optional
+from services.models import Product
+
+# Optional fast decoders; the stdlib json module is the fallback
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('msgspec', 'orjson', 'json')
+
+if msgspec is not None:
+    # Schemas for schema-directed decoding: fields not declared here are
+    # skipped by the parser instead of being materialized and thrown away
+    class _Meta(msgspec.Struct):
+        updatedAt: Optional[str] = None
+
+    class _ApiProduct(msgspec.Struct):
+        id: int
+        title: Optional[str] = None
+        description: Optional[str] = None
+        category: Optional[str] = None
+        brand: Optional[str] = None
+        price: Optional[float] = None
+        discountPercentage: Optional[float] = None
+        rating: Optional[float] = None
+        thumbnail: Optional[str] = None
+        images: Optional[List[str]] = None
+        meta: Optional[_Meta] = None
+
+        def to_product(self) -> Product:
+            return Product.build(
+                self.id, self.title, self.description, self.category, self.brand,
+                self.price, self.discountPercentage, self.rating, self.thumbnail,
+                self.images, self.meta.updatedAt if self.meta else None
+            )
+
+    class _ApiProductList(msgspec.Struct):
+        products: List[_ApiProduct] = []
+        total: int = 0
+
+
+def available_backends() -> List[str]:
+    '''Installed decoder backends, fastest first'''
+    installed = {'msgspec': msgspec is not None, 'orjson': orjson is not None, 'json': True}
+    return [name for name in BACKENDS if installed[name]]
+
+
+class JSONDecoder:
+    '''Decodes API response bodies with the fastest installed library
+
+    ``backend`` is one of BACKENDS or ``'auto'``. With msgspec, product
+    responses are decoded straight against a schema of the fields Product
+    uses; the other backends decode the whole document and then pick the
+    fields out.
+    '''
+
+    def __init__(self, backend: str = 'auto'):
+        if backend == 'auto':
+            backend = available_backends()[0]
+        if backend not in available_backends():
+            raise ValueError(f"JSON decoder backend {backend!r} is not available")
+        self.backend = backend
+
+        self.loads: Callable[[bytes], Any]
+        if backend == 'msgspec':
+            self.loads = msgspec.json.Decoder().decode
+            self._product = msgspec.json.Decoder(_ApiProduct).decode
+            self._product_list = msgspec.json.Decoder(_ApiProductList).decode
+        elif backend == 'orjson':
+            self.loads = orjson.loads
+        else:
+            self.loads = json.loads
+
+    def product(self, body: bytes) -> Product:
+        '''Decode a single /products/{id} response'''
+        if self.backend == 'msgspec':
+            return self._product(body).to_product()
+        return Product.from_api(self.loads(body))
+
+    def product_list(self, body: bytes) -> Dict[str, Any]:
+        '''Decode a product list response into ``{'products': [Product], 'total': int}``'''
+        if self.backend == 'msgspec':
+            data = self._product_list(body)
+            return {'products': [product.to_product() for product in data.products],
+                    'total': data.total}
+        data = self.loads(body)
+        return {'products': [Product.from_api(product) for product in data.get('products', [])],
+                'total': data.get('total', 0)}
@@ -0,0 +1,63 @@
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(frozen=True, slots=True)
+class Product:
+    '''The parts of a DummyJSON product the bot uses
+
+    Parsed once where API responses enter the service, so reviews,
+    dimensions, image lists and the rest of the payload are never kept.
+    '''
+    id: int
+    title: str = ''
+    description: str = ''
+    category: str = ''
+    brand: str = ''
+    price: float = 0.0
+    discount_percentage: float = 0.0
+    final_price: float = 0.0
+    rating: float = 0.0
+    image: str = ''
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def build(cls, id: int, title: Optional[str], description: Optional[str],
+              category: Optional[str], brand: Optional[str], price: Optional[float],
+              discount_percentage: Optional[float], rating: Optional[float],
+              thumbnail: Optional[str], images: Optional[List[str]],
+              updated_at: Optional[str]) -> 'Product':
+        '''Build a Product from API field values, any of which may be missing'''
+        price = float(price or 0)
+        discount = float(discount_percentage or 0)
+        return cls(
+            id=id,
+            title=title or '',
+            description=description or '',
+            # Few distinct values shared by many products
+            category=sys.intern(category or ''),
+            brand=sys.intern(brand or ''),
+            price=price,
+            discount_percentage=discount,
+            # Rounded to cents so carts and orders never store float noise
+            final_price=round(price - (price * discount / 100), 2),
+            rating=float(rating or 0),
+            image=thumbnail or (images or [''])[0],
+            updated_at=updated_at
+        )
+
+    @staticmethod
+    def format_number(value: float) -> str:
+        '''Show a number the way the API sent it: 549.0 -> "549", 12.5 -> "12.5"'''
+        return str(int(value)) if value.is_integer() else str(value)
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> 'Product':
+        '''Build a Product from a (possibly ``select``-ed) API product dict'''
+        return cls.build(
+            data['id'], data.get('title'), data.get('description'), data.get('category'),
+            data.get('brand'), data.get('price'), data.get('discountPercentage'),
+            data.get('rating'), data.get('thumbnail'), data.get('images'),
+            (data.get('meta') or {}).get('updatedAt')
+        )
@@ -0,0 +1,194 @@
+import bisect
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from services.models import Product
+
+# Field weights: a title hit outranks a brand hit, which outranks a description hit
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'brand': 2.0,
+    'category': 1.5,
+    'description': 1.0
+}
+
+# Score multipliers for how a query token matched an index term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+FUZZY_MATCH = 0.5
+
+# Uzbek Latin uses several look-alike characters for the o'/g' apostrophe
+_APOSTROPHES = str.maketrans({'ʻ': "'", 'ʼ': "'", '‘': "'", '’': "'", '`': "'", '´': "'"})
+
+# Russian and Uzbek Cyrillic to Latin, so "ноутбук" can still hit "noutbuk"-style terms
+_CYRILLIC_TO_LATIN = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h'
+})
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text: str) -> List[str]:
+    '''Split text into normalized search terms
+
+    NFKC + casefold, Uzbek apostrophe variants unified and dropped inside words
+    (``o'zbek`` -> ``ozbek``), Cyrillic words also emitted transliterated.
+    '''
+    text = unicodedata.normalize('NFKC', text).casefold().translate(_APOSTROPHES)
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        token = token.replace("'", '')
+        tokens.append(token)
+        latin = token.translate(_CYRILLIC_TO_LATIN)
+        if latin != token:
+            tokens.append(latin)
+    return tokens
+
+
+def _query_groups(query: str) -> List[Tuple[str, ...]]:
+    '''Query tokens, each with its transliterated alternative if it has one'''
+    text = unicodedata.normalize('NFKC', query).casefold().translate(_APOSTROPHES)
+    groups = []
+    for token in _TOKEN_RE.findall(text):
+        token = token.replace("'", '')
+        latin = token.translate(_CYRILLIC_TO_LATIN)
+        groups.append((token, latin) if latin != token else (token,))
+    return groups
+
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    '''Edit distance (with adjacent transpositions) <= limit, stopping early once exceeded'''
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            )
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return False
+        before_previous, previous = previous, current
+    return previous[-1] <= limit
+
+
+class SearchIndex:
+    '''In-memory inverted index over title, description, brand and category
+
+    Every query token must match (exactly, as a prefix, or within a small edit
+    distance) for a product to rank in the top tier; products matching only
+    some tokens follow. Within a tier results are ordered by a TF-IDF score
+    weighted per field and per match kind.
+    '''
+
+    def __init__(self):
+        self._docs: Dict[int, Product] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms: List[str] = []
+        self._terms_by_length: Dict[int, List[str]] = {}
+        self._idf: Dict[str, float] = {}
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._docs)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def rebuild(self, products: Iterable[Product]):
+        '''Index a full product list, replacing the previous index in one step'''
+        docs = {}
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for product in products:
+            product_id = product.id
+            docs[product_id] = product
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(getattr(product, field)):
+                    doc_weights = postings[term]
+                    doc_weights[product_id] = doc_weights.get(product_id, 0.0) + weight
+
+        count = len(docs)
+        terms = sorted(postings)
+        terms_by_length: Dict[int, List[str]] = defaultdict(list)
+        for term in terms:
+            terms_by_length[len(term)].append(term)
+
+        self._idf = {term: math.log(1 + count / len(doc_weights))
+                     for term, doc_weights in postings.items()}
+        self._postings = dict(postings)
+        self._terms = terms
+        self._terms_by_length = dict(terms_by_length)
+        self._docs = docs
+
+    def _prefix_terms(self, token: str) -> List[str]:
+        start = bisect.bisect_left(self._terms, token)
+        matches = []
+        for term in self._terms[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+            if not term.startswith(token):
+                break
+            if term != token:
+                matches.append(term)
+        return matches
+
+    def _fuzzy_terms(self, token: str) -> List[str]:
+        limit = 2 if len(token) >= 8 else 1
+        matches = []
+        for length in range(len(token) - limit, len(token) + limit + 1):
+            for term in self._terms_by_length.get(length, ()):
+                if _within_distance(token, term, limit):
+                    matches.append(term)
+        return matches
+
+    def _match_group(self, group: Tuple[str, ...]) -> Dict[int, float]:
+        '''Best score per product for one query position'''
+        candidates = []
+        for token in group:
+            if token in self._postings:
+                candidates.append((token, EXACT_MATCH))
+            if len(token) >= 2:
+                candidates.extend((term, PREFIX_MATCH) for term in self._prefix_terms(token))
+        if not candidates:
+            for token in group:
+                if len(token) >= 4:
+                    candidates.extend((term, FUZZY_MATCH) for term in self._fuzzy_terms(token))
+
+        scores: Dict[int, float] = {}
+        for term, multiplier in candidates:
+            idf = self._idf[term]
+            for product_id, weight in self._postings[term].items():
+                score = idf * weight * multiplier
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = 30) -> List[Product]:
+        '''Ranked products for a free-text query'''
+        totals: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for group in _query_groups(query):
+            for product_id, score in self._match_group(group).items():
+                totals[product_id] += score
+                matched[product_id] += 1
+
+        ranked = sorted(totals, key=lambda product_id: (-matched[product_id], -totals[product_id], product_id))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self._docs[product_id] for product_id in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'products': len(self._docs), 'terms': len(self._terms)}
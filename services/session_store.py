@@ -0,0 +1,128 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+from services.catalog_mirror import CatalogMirror
+from services.models import Product
+from utils.cache import TTLCache
+
+
+class ProductStore:
+    '''Shared product cache that browse and search sessions reference by id
+
+    Keeps the newest copy of each product seen by any user together with
+    the time it was loaded. Products in the catalog mirror are taken from
+    there when the mirror's copy is newer.
+    '''
+
+    def __init__(self, mirror: CatalogMirror, maxsize: int = 5000, ttl: float = 3600):
+        self.mirror = mirror
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def put(self, products: Iterable[Product], loaded_at: float) -> List[int]:
+        '''Remember products loaded at ``loaded_at``; returns their ids in order'''
+        product_ids = []
+        for product in products:
+            cached = self.cache.get(product.id, count=False)
+            if cached is None or cached[1] <= loaded_at:
+                self.cache.set(product.id, (product, loaded_at))
+            product_ids.append(product.id)
+        return product_ids
+
+    def get(self, product_id: int) -> Tuple[Optional[Product], float]:
+        '''Newest local copy of a product and when it was loaded'''
+        product, loaded_at = self.cache.get(product_id, (None, 0.0))
+        mirrored = self.mirror.get_product(product_id)
+        if mirrored and (self.mirror.synced_at or 0) > loaded_at:
+            return mirrored, self.mirror.synced_at
+        return product, loaded_at
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+class Session:
+    '''Products a user is paging through, stored as ids only'''
+    __slots__ = ('product_ids', 'current_page', 'expires_at', 'size')
+
+    def __init__(self, product_ids: Tuple[int, ...], expires_at: float):
+        self.product_ids = product_ids
+        self.current_page = 0
+        self.expires_at = expires_at
+        # Approximate bytes held by this session (object, tuple and the ints)
+        self.size = (sys.getsizeof(self) + sys.getsizeof(product_ids)
+                     + sum(sys.getsizeof(product_id) for product_id in product_ids))
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+
+class SessionStore:
+    '''Bounded LRU store of paging sessions with a sliding per-entry TTL
+
+    Keys are ``(kind, user_id)`` tuples, e.g. ``('browse', 42)``. The least
+    recently used session is evicted once ``maxsize`` is reached, and a
+    session not touched for its TTL is dropped on the next access.
+    '''
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions: 'OrderedDict[Hashable, Tuple[Session, float]]' = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def start(self, key: Hashable, product_ids: Iterable[int], ttl: Optional[float] = None) -> Session:
+        '''Begin a new session, replacing any previous one under the same key'''
+        ttl = self.ttl if ttl is None else ttl
+        self.pop(key)
+        session = Session(tuple(product_ids), time.monotonic() + ttl)
+        self._sessions[key] = (session, ttl)
+        self.bytes += session.size
+        while len(self._sessions) > self.maxsize:
+            _, (evicted, _) = self._sessions.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+        return session
+
+    def get(self, key: Hashable) -> Optional[Session]:
+        '''Return a live session, extending its TTL, or None'''
+        entry = self._sessions.get(key)
+        if entry is not None:
+            session, ttl = entry
+            now = time.monotonic()
+            if session.expires_at > now:
+                session.expires_at = now + ttl
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return session
+            self.pop(key)
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def pop(self, key: Hashable) -> Optional[Session]:
+        '''End a session'''
+        entry = self._sessions.pop(key, None)
+        if entry is None:
+            return None
+        self.bytes -= entry[0].size
+        return entry[0]
+
+    def stats(self) -> Dict[str, Any]:
+        '''Gauge of current entries and approximate bytes, plus counters'''
+        return {
+            'entries': len(self._sessions),
+            'approx_bytes': self.bytes,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
@@ -1,3 +1,7 @@
+from string import Formatter
+from typing import Dict, Optional, Tuple
+from config import LANGUAGES
+
 # Multi-language translations dictionary
 
 TRANSLATIONS = {
@@ -295,12 +299,77 @@ TRANSLATIONS = {
         'uz': '✅ Xabar {count} foydalanuvchiga yuborildi',
         'ru': '✅ Сообщение отправлено {count} пользователям',
         'en': '✅ Message sent to {count} users'
+    },
+    'broadcast_started': {
+        'uz': '📢 Xabar yuborish boshlandi. Jarayon shu yerda ko\'rsatiladi.',
+        'ru': '📢 Рассылка запущена. Прогресс будет показан здесь.',
+        'en': '📢 Broadcast started. Progress will be shown here.'
+    },
+    'broadcast_progress': {
+        'uz': '📢 Yuborilmoqda: {done}/{total}\n✅ Yuborildi: {sent}\n🚫 Bloklagan: {blocked}\n❌ Xatolik: {failed}',
+        'ru': '📢 Рассылка: {done}/{total}\n✅ Отправлено: {sent}\n🚫 Заблокировали: {blocked}\n❌ Ошибки: {failed}',
+        'en': '📢 Broadcasting: {done}/{total}\n✅ Sent: {sent}\n🚫 Blocked: {blocked}\n❌ Failed: {failed}'
+    },
+    'broadcast_done': {
+        'uz': '✅ Xabar yuborish tugadi: {sent} ta yuborildi, {blocked} ta bloklagan, {failed} ta xatolik',
+        'ru': '✅ Рассылка завершена: отправлено {sent}, заблокировали {blocked}, ошибок {failed}',
+        'en': '✅ Broadcast finished: {sent} sent, {blocked} blocked, {failed} failed'
     }
 }
 
+# ============ COMPILED CATALOG ============
+# Built once at import: a flat text table per language with the fallbacks
+# already applied, format templates converted to %-style, and a reverse
+# index from reply-keyboard button text to the action it stands for.
+
+# Reply-keyboard buttons routed by MenuAction (filters/menu.py)
+MENU_KEYS = ('catalog', 'cart', 'search', 'my_orders', 'settings', 'admin_panel')
+
+
+def _compile_template(text: str) -> Optional[str]:
+    '''str.format template -> equivalent %-style template (None if it needs str.format)'''
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(text):
+        parts.append(literal.replace('%', '%%'))
+        if field is not None:
+            if spec or conversion or not field.isidentifier():
+                return None
+            parts.append(f'%({field})s')
+    return ''.join(parts)
+
+
+def _compile():
+    languages = ['en'] + [lang for lang in LANGUAGES if lang != 'en']
+    texts: Dict[str, Dict[str, str]] = {}
+    templates: Dict[str, Dict[str, Optional[str]]] = {}
+    for lang in languages:
+        texts[lang] = {key: values.get(lang, values.get('en', key))
+                       for key, values in TRANSLATIONS.items()}
+        templates[lang] = {key: _compile_template(text) for key, text in texts[lang].items()}
+
+    menu: Dict[str, Tuple[str, str]] = {}
+    entries = [(key, lang, texts[lang][key]) for lang in LANGUAGES for key in MENU_KEYS]
+    entries += [('language', lang, name) for lang, name in LANGUAGES.items()]
+    for action, lang, text in entries:
+        # Identical texts in several languages keep the first language
+        if menu.setdefault(text, (action, lang))[0] != action:
+            raise ValueError(f"Button text {text!r} is used by {menu[text][0]!r} and {action!r}")
+    return texts, templates, menu
+
+
+_TEXTS, _TEMPLATES, MENU_INDEX = _compile()
+
+
 def get_text(key: str, lang: str = 'uz', **kwargs) -> str:
     '''Get translated text by key and language'''
-    text = TRANSLATIONS.get(key, {}).get(lang, TRANSLATIONS.get(key, {}).get('en', key))
-    if kwargs:
-        text = text.format(**kwargs)
-    return text
\ No newline at end of file
+    if not kwargs:
+        return (_TEXTS.get(lang) or _TEXTS['en']).get(key, key)
+    template = (_TEMPLATES.get(lang) or _TEMPLATES['en']).get(key, key)
+    if template is None:
+        return (_TEXTS.get(lang) or _TEXTS['en'])[key].format(**kwargs)
+    return template % kwargs
+
+
+def menu_action(text: Optional[str]) -> Optional[Tuple[str, str]]:
+    '''(action, language) of a reply-keyboard button text, or None'''
+    return MENU_INDEX.get(text) if text else None
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import signal
+from typing import Any, Dict
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from config import (WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+                    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_SHUTDOWN_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateHandler(SimpleRequestHandler):
+    '''Webhook endpoint that answers Telegram at once and handles updates in tasks
+
+    On shutdown the updates still being handled get WEBHOOK_SHUTDOWN_TIMEOUT
+    seconds to finish before the dispatcher's shutdown hooks close the
+    shared resources.
+    '''
+
+    @property
+    def pending(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def drain(self, timeout: float):
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info("Waiting for %s in-flight updates", len(tasks))
+        _, unfinished = await asyncio.wait(tasks, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            logger.warning("Cancelled %s updates still running after %ss", len(unfinished), timeout)
+
+
+def create_app(bot: Bot, dp: Dispatcher, dependencies: Dict[str, Any]) -> web.Application:
+    '''aiohttp application serving POST WEBHOOK_PATH and GET /healthz'''
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set in webhook mode")
+
+    app = web.Application()
+    handler = UpdateHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET, **dependencies)
+    app.router.add_post(WEBHOOK_PATH, handler.handle)
+
+    async def healthz(request: web.Request) -> web.Response:
+        '''200 once the database is open; used by the load balancer'''
+        db = dependencies['db']
+        body = {
+            'status': 'ok' if db.pool.is_open else 'starting',
+            'catalog_ready': dependencies['mirror'].ready,
+            'pending_updates': handler.pending
+        }
+        return web.json_response(body, status=200 if db.pool.is_open else 503)
+
+    app.router.add_get('/healthz', healthz)
+
+    async def on_startup(app: web.Application):
+        await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data, **dependencies)
+        if WEBHOOK_BASE_URL:
+            await bot.set_webhook(
+                WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info("Webhook set to %s%s", WEBHOOK_BASE_URL, WEBHOOK_PATH)
+
+    async def on_shutdown(app: web.Application):
+        # The webhook stays registered: Telegram queues updates until we are back
+        await handler.drain(WEBHOOK_SHUTDOWN_TIMEOUT)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data, **dependencies)
+        await bot.session.close()
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, dependencies: Dict[str, Any]):
+    '''Serve the webhook app until SIGTERM/SIGINT, then shut down gracefully'''
+    runner = web.AppRunner(create_app(bot, dp, dependencies), handle_signals=False)
+    await runner.setup()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C still ends asyncio.run() and the finally below runs
+            pass
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        logger.info("Webhook server listening on %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        await stop.wait()
+        logger.info("Shutting down webhook server")
+    finally:
+        # Stops accepting requests, then runs on_shutdown above
+        await runner.cleanup()